@@ -108,9 +108,11 @@
 # agents/customer_agent.py
 from dataclasses import dataclass
 from typing import Dict, List, Optional
-import ollama
 import json
 from utils.data_loader import DataHandler
+from utils.llm_client import get_llm_client
+from utils.preference_cache import PreferenceCache
+from utils.segment_priors import PreferenceResolver
 
 @dataclass
 class CustomerProfile:
@@ -126,11 +128,15 @@ class CustomerProfile:
     season: str
 
 class CustomerAgent:
-    def __init__(self, customer_id: str, data_handler: DataHandler):
+    def __init__(self, customer_id: str, data_handler: DataHandler,
+                 preference_cache: Optional[PreferenceCache] = None,
+                 preference_resolver: Optional[PreferenceResolver] = None):
         self.customer_id = customer_id
         self.data_handler = data_handler
+        self.preference_cache = preference_cache
+        self.preference_resolver = preference_resolver
         self.profile = self._load_profile()
-        self.preferences = self._analyze_preferences() if self.profile else None
+        self.preferences = self._load_preferences() if self.profile else None
         
     def _load_profile(self) -> Optional[CustomerProfile]:
         """Load customer profile from database"""
@@ -138,20 +144,16 @@ class CustomerAgent:
         if not raw_data:
             return None
             
-        # Safely parse JSON-like strings
-        def parse_history(history_str):
-            try:
-                return eval(history_str)
-            except:
-                return []
+        # Lists come pre-parsed from the history index, never from the stored strings
+        history = self.data_handler.get_customer_history(self.customer_id) or {}
         
         return CustomerProfile(
             customer_id=raw_data['Customer_ID'],
             age=raw_data['Age'],
             gender=raw_data['Gender'],
             location=raw_data['Location'],
-            browsing_history=parse_history(raw_data['Browsing_History']),
-            purchase_history=parse_history(raw_data['Purchase_History']),
+            browsing_history=history.get('Browsing_History', []),
+            purchase_history=history.get('Purchase_History', []),
             customer_segment=raw_data['Customer_Segment'],
             avg_order_value=raw_data['Avg_Order_Value'],
             holiday=raw_data['Holiday'],
@@ -159,6 +161,23 @@ class CustomerAgent:
         )
     
     # ... rest of the file ...
+
+    def _load_preferences(self) -> Dict:
+        """Resolve preferences from the segment prior, the cache, or (last) the LLM"""
+        if self.preference_resolver is not None:
+            preferences = self.preference_resolver.resolve(self.profile)
+            if preferences is not None:
+                return preferences
+        
+        if self.preference_cache is None:
+            return self._analyze_preferences()
+
+        profile_hash = PreferenceCache.profile_hash(self.profile)
+        preferences = self.preference_cache.get(self.customer_id, profile_hash)
+        if preferences is None:
+            preferences = self._analyze_preferences()
+            self.preference_cache.put(self.customer_id, profile_hash, preferences)
+        return preferences
     
     # def _analyze_preferences(self) -> Dict:
     #     """Analyze customer preferences using LLM"""
@@ -212,11 +231,7 @@ class CustomerAgent:
         }}
         """
         
-        response = ollama.chat(
-            model='gemma:2b',
-            messages=[{'role': 'user', 'content': prompt}],
-            format='json'  # Explicitly request JSON format
-        )
+        content = get_llm_client().chat(prompt, format='json')  # Explicitly request JSON format
         
         # Safer JSON parsing with error handling
         try:
@@ -224,11 +239,11 @@ class CustomerAgent:
             from json import JSONDecodeError
             
             # First try standard JSON parsing
-            return json.loads(response['message']['content'])
+            return json.loads(content)
         except JSONDecodeError:
             # Fallback: replace problematic values before eval
             fixed_content = (
-                response['message']['content']
+                content
                 .replace(': true', ': True')
                 .replace(': false', ': False')
             )
@@ -248,11 +263,18 @@ class CustomerAgent:
         if 'purchased_items' in new_interaction:
             self.profile.purchase_history.extend(new_interaction['purchased_items'])
         
+        # History feeds the preference prompt, so cached preferences are stale
+        if self.preference_cache is not None and (
+            'browsed_items' in new_interaction or 'purchased_items' in new_interaction
+        ):
+            self.preference_cache.invalidate(self.customer_id)
+        
         # Update other fields as needed
         # Then save back to database
         self._save_profile()
     
     def _save_profile(self):
-        """Save updated profile back to database"""
-        # Implementation would update SQLite database
-        pass
\ No newline at end of file
+        """Save updated profile back to database (the write is change-logged)"""
+        self.data_handler.update_customer_history(
+            self.customer_id, self.profile.browsing_history, self.profile.purchase_history
+        )
\ No newline at end of file
@@ -1,6 +1,6 @@
 from typing import Dict
-import ollama
 from utils.data_loader import DataHandler
+from utils.llm_client import get_llm_client
 
 class FeedbackAgent:
     def __init__(self, data_handler):
@@ -29,13 +29,8 @@ class FeedbackAgent:
         Return only a single float number representing the sentiment score.
         """
         
-        response = ollama.chat(
-            model='gemma:2b',
-            messages=[{'role': 'user', 'content': prompt}]
-        )
-        
         try:
-            return float(response['message']['content'])
+            return float(get_llm_client().chat(prompt))
         except:
             return 0.0
     
@@ -58,9 +53,4 @@ class FeedbackAgent:
         Provide 2-3 actionable suggestions to improve future recommendations for this customer.
         """
         
-        response = ollama.chat(
-            model='gemma:2b',
-            messages=[{'role': 'user', 'content': prompt}]
-        )
-        
-        return response['message']['content']
\ No newline at end of file
+        return get_llm_client().chat(prompt)
\ No newline at end of file
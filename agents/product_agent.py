@@ -1,7 +1,7 @@
-from typing import Dict, List
-import ollama
-import pandas as pd
+from typing import Dict, Iterable, List, Optional
+from tqdm import tqdm
 from utils.data_loader import DataHandler
+from utils.llm_client import get_llm_client
 
 class ProductAgent:
     def __init__(self, data_handler: DataHandler):
@@ -11,18 +11,20 @@ class ProductAgent:
         """Get detailed information about a product"""
         return self.data_handler.get_product_data(product_id)
     
-    def find_similar_products(self, product_id: str) -> List[Dict]:
+    def find_similar_products(self, product_id: str, k: Optional[int] = None) -> List[Dict]:
         """Find similar products based on product relationships"""
-        similar_ids = self.data_handler.get_similar_products(product_id)
-        return [self.get_product_details(pid) for pid in similar_ids]
+        catalog = self.data_handler.catalog
+        return catalog.records(catalog.similar_rows(product_id, k))
+    
+    def more_like_this(self, product_ids: Iterable[str], limit: int = 10) -> List[Dict]:
+        """Products similar to any of the given ones (e.g. a customer's recommendations)"""
+        catalog = self.data_handler.catalog
+        return catalog.records(catalog.more_like_this_rows(product_ids, limit))
     
     def analyze_product_trends(self, category: str = None) -> Dict:
         """Analyze trends for products or categories using LLM"""
-        query = "SELECT * FROM products"
-        if category:
-            query += f" WHERE category = '{category}'"
-        
-        products = pd.read_sql(query, self.data_handler.conn)
+        catalog = self.data_handler.catalog
+        products = catalog.to_frame(catalog.category_rows([category] if category else None))
         
         prompt = f"""
         Analyze the following product data and identify trends:
@@ -38,34 +40,38 @@ class ProductAgent:
         Return your analysis in markdown format.
         """
         
-        response = ollama.chat(
-            model='gemma:2b',
-            messages=[{'role': 'user', 'content': prompt}]
-        )
-        
-        return response['message']['content']
+        return get_llm_client().chat(prompt)
     
     def generate_product_description(self, product_id: str) -> str:
-        """Generate compelling product description using LLM"""
+        """Generate compelling product description using LLM (cached per product row)"""
         product = self.get_product_details(product_id)
+        return get_llm_client().chat(self._description_prompt(product), cached=True)
+    
+    def warm_descriptions(self, product_ids: Optional[Iterable[str]] = None, batch_size: int = 64) -> int:
+        """Precompute cached descriptions (whole catalog by default); returns how many were generated"""
+        client = get_llm_client()
+        if product_ids is None:
+            product_ids = self.data_handler.catalog.product_ids
+        products = [product for product in map(self.get_product_details, product_ids) if product]
         
-        prompt = f"""
+        generated = 0
+        for start in tqdm(range(0, len(products), batch_size), desc="Warming descriptions"):
+            batch = products[start:start + batch_size]
+            results = client.map([self._description_prompt(p) for p in batch], cached=True)
+            generated += sum(result is not None for result in results)
+        return generated
+    
+    def _description_prompt(self, product: Dict) -> str:
+        return f"""
         Create a compelling product description for marketing purposes based on:
-        - Category: {product['category']}
-        - Subcategory: {product['subcategory']}
-        - Brand: {product['brand']}
-        - Price: {product['price']}
-        - Average Rating: {product['product_rating']}
-        - Sentiment Score: {product['customer_review_sentiment_score']}
+        - Category: {product['Category']}
+        - Subcategory: {product['Subcategory']}
+        - Brand: {product['Brand']}
+        - Price: {product['Price']}
+        - Average Rating: {product['Product_Rating']}
+        - Sentiment Score: {product['Customer_Review_Sentiment_Score']}
         
         Make it engaging and highlight unique selling points.
         """
-        
-        response = ollama.chat(
-            model='gemma:2b',
-            messages=[{'role': 'user', 'content': prompt}]
-        )
-        
-        return response['message']['content']
     
     
\ No newline at end of file
@@ -1,96 +1,60 @@
 # agents/recommendation_agent.py
-from typing import Dict, List
-import ollama
+from typing import Dict, List, Optional
 import numpy as np
 import pandas as pd
 from .customer_agent import CustomerAgent
 from .product_agent import ProductAgent
+from utils.co_occurrence import CO_PURCHASE_CANDIDATES
+from utils.llm_client import get_llm_client
+from utils.scoring import AGENT_WEIGHTS, VectorizedScorer
+
+# Seconds to wait for explanations before returning without the missing ones
+EXPLANATION_DEADLINE = 10.0
 
 class RecommendationAgent:
     def __init__(self, customer_agent: CustomerAgent, product_agent: ProductAgent):
         self.customer_agent = customer_agent
         self.product_agent = product_agent
     
-    def generate_recommendations(self, n_recommendations: int = 5) -> List[Dict]:
-        """Generate personalized product recommendations"""
+    def generate_recommendations(self, n_recommendations: int = 5, explain: bool = False,
+                                 explanation_deadline: float = EXPLANATION_DEADLINE) -> List[Dict]:
+        """Generate personalized product recommendations (optionally with explanations)"""
         preferences = self.customer_agent.get_preferences()
-        
-        # Updated query with correct column names
-        query = f"""
-        SELECT * FROM products 
-        WHERE Category IN ({','.join([f"'{cat}'" for cat in preferences['preferred_categories']])})
-        ORDER BY Product_Rating DESC
-        LIMIT 100
-        """
-        
-        candidate_products = pd.read_sql(query, self.customer_agent.data_handler.conn)
+        profile = self.customer_agent.profile
+        data_handler = self.customer_agent.data_handler
+        affinity = data_handler.co_occurrence.affinity(profile.browsing_history + profile.purchase_history)
+        
+        # Top-rated products of the preferred categories from the in-memory catalog,
+        # plus those of the subcategories most often found with the customer's history
+        catalog = data_handler.catalog
+        rows = catalog.top_rated_rows(preferences['preferred_categories'], limit=100)
+        # Affinity also covers categories; only product subcategories can add candidates
+        subcategories = [item for item in affinity if item in catalog.subcategory_rated_lists]
+        co_purchased = sorted(subcategories, key=lambda item: -affinity[item])[:CO_PURCHASE_CANDIDATES]
+        extra = catalog.top_rated_subcategory_rows(co_purchased, limit=20)
+        rows = np.concatenate([rows, extra[~np.isin(extra, rows)]])
+        candidate_products = catalog.to_frame(rows)
         
         # Score products based on customer preferences
-        candidate_products['score'] = candidate_products.apply(
-            lambda row: self._score_product(row, preferences),
-            axis=1
-        )
+        candidate_products['score'] = self._score_products(candidate_products, preferences, affinity)
         
         # Get top recommendations
-        recommendations = candidate_products.sort_values('score', ascending=False).head(n_recommendations)
-        
-        # Generate explanations for recommendations
-        recommendations['explanation'] = recommendations.apply(
-            lambda row: self._generate_explanation(row.to_dict(), preferences),
-            axis=1
-        )
-        
-        return recommendations.to_dict('records')
-
-    def generate_recommendations(self, n_recommendations: int = 5) -> List[Dict]:
-        """Generate personalized product recommendations without explanations"""
-        preferences = self.customer_agent.get_preferences()
-        
-        query = f"""
-        SELECT * FROM products 
-        WHERE Category IN ({','.join([f"'{cat}'" for cat in preferences['preferred_categories']])})
-        ORDER BY Product_Rating DESC
-        LIMIT 100
-        """
-        
-        candidate_products = pd.read_sql(query, self.customer_agent.data_handler.conn)
-        
-        # Score products based on customer preferences
-        candidate_products['score'] = candidate_products.apply(
-            lambda row: self._score_product(row, preferences),
-            axis=1
-        )
-        
-        # Get top recommendations without explanations
         recommendations = candidate_products.sort_values('score', ascending=False)\
-                                          .head(n_recommendations)
+                                          .head(n_recommendations).to_dict('records')
         
-        return recommendations.to_dict('records')
+        if explain:
+            self._add_explanations(recommendations, preferences, explanation_deadline)
+        
+        return recommendations
 
     
-    def _score_product(self, product: Dict, preferences: Dict) -> float:
-        """Score a product based on customer preferences"""
-        score = 0
-        
-        # Updated column names to match your schema
-        if product['Category'] in preferences['preferred_categories']:
-            score += 0.3
-        
-        price_range = self._get_price_range(product['Price'])
-        if price_range == preferences['price_range']:
-            score += 0.2
-        
-        if product['Brand'] in preferences.get('brand_preferences', []):
-            score += 0.2
-        
-        score += product['Product_Rating'] * 0.1
-        score += product['Customer_Review_Sentiment_Score'] * 0.1
-        
-        purchased_items = self.customer_agent.profile.purchase_history
-        if product['Category'] in purchased_items:
-            score += 0.1
-        
-        return score
+    def _score_products(self, products: pd.DataFrame, preferences: Dict,
+                        affinity: Optional[Dict[str, float]] = None) -> np.ndarray:
+        """Score products based on customer preferences (category, price, brand,
+        rating, sentiment, purchase history and co-purchase affinity) in one vectorized pass"""
+        scorer = VectorizedScorer(products, AGENT_WEIGHTS)
+        return scorer.score(preferences, self.customer_agent.profile.purchase_history,
+                            affinity=affinity)
     
     def _get_price_range(self, price: float) -> str:
         """Categorize price into range"""
@@ -101,9 +65,19 @@ class RecommendationAgent:
         else:
             return 'high'
     
+    def _add_explanations(self, recommendations: List[Dict], preferences: Dict, deadline: float):
+        """Explain all recommendations concurrently; any not ready by the deadline stay empty"""
+        prompts = [self._explanation_prompt(product, preferences) for product in recommendations]
+        explanations = get_llm_client().map(prompts, deadline=deadline, cached=True)
+        for product, explanation in zip(recommendations, explanations):
+            product['explanation'] = explanation or ''
+    
     def _generate_explanation(self, product: Dict, preferences: Dict) -> str:
         """Generate natural language explanation for recommendation"""
-        prompt = f"""
+        return get_llm_client().chat(self._explanation_prompt(product, preferences), cached=True)
+    
+    def _explanation_prompt(self, product: Dict, preferences: Dict) -> str:
+        return f"""
         Explain why this product would be a good recommendation for this customer:
         
         Customer Preferences:
@@ -113,11 +87,4 @@ class RecommendationAgent:
         {product}
         
         Provide a concise 1-2 sentence explanation.
-        """
-        
-        response = ollama.chat(
-            model='gemma:2b',
-            messages=[{'role': 'user', 'content': prompt}]
-        )
-        
-        return response['message']['content']
\ No newline at end of file
+        """
\ No newline at end of file
@@ -1,11 +1,54 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify
 from system_orchestrator import EcommerceRecommendationSystem
+from utils.connection_pool import ConnectionPool
+from utils.job_queue import JobManager
+from utils.llm_client import get_llm_client
+from utils.recommendation_store import PrecomputedIndex
+import atexit
+import json
+import os
+import threading
 import time
 import random
-import ollama
 
 app = Flask(__name__)
 
+DB_NAME = 'ecommerce.db'
+# Product shards and co-occurrence model; match database_updater.py --cache-dir
+CACHE_DIR = os.environ.get('CACHE_DIR', 'cache')
+
+# Serve offline batch results when fresh; set SERVE_PRECOMPUTED=0 to always generate live
+SERVE_PRECOMPUTED = os.environ.get('SERVE_PRECOMPUTED', '1') != '0'
+RECOMMENDATION_MAX_AGE = float(os.environ.get('RECOMMENDATION_MAX_AGE', 24 * 3600))
+# Background threads that run recommendation jobs
+RECOMMENDATION_WORKERS = int(os.environ.get('RECOMMENDATION_WORKERS', 4))
+
+# Application-scoped recommendation system shared by all requests
+_system = None
+_system_lock = threading.Lock()
+
+def get_system() -> EcommerceRecommendationSystem:
+    """Return the shared recommendation system, creating it on first use"""
+    global _system
+    if _system is None:
+        with _system_lock:
+            if _system is None:
+                precomputed = PrecomputedIndex(RECOMMENDATION_MAX_AGE) if SERVE_PRECOMPUTED else None
+                _system = EcommerceRecommendationSystem(
+                    DB_NAME, pool=ConnectionPool(DB_NAME), precomputed=precomputed, cache_dir=CACHE_DIR
+                )
+    return _system
+
+@atexit.register
+def shutdown_system():
+    """Stop background jobs and close the shared system and its connection pool"""
+    global _system
+    jobs.shutdown()
+    with _system_lock:
+        if _system is not None:
+            _system.close()
+            _system = None
+
 # Predefined patience quotes
 PATIENCE_QUOTES = [
     "Good things come to those who wait...",
@@ -15,6 +58,19 @@ PATIENCE_QUOTES = [
     "Your personalized picks are being prepared with care..."
 ]
 
+def _recommendation_job(customer_id, report):
+    """Background job body: serve or generate recommendations for one customer"""
+    report(0.2, random.choice(PATIENCE_QUOTES))
+    recs = get_system().get_served_recommendations(customer_id)
+    if not recs:
+        return None
+    return {
+        'recommendations': recs['recommendations'],
+        'source': recs.get('source')
+    }
+
+jobs = JobManager(_recommendation_job, max_workers=RECOMMENDATION_WORKERS)
+
 @app.route('/')
 def home():
     return render_template('index.html')
@@ -32,11 +88,9 @@ def get_recommendations():
 @app.route('/generate_recommendations', methods=['POST'])
 def generate_recommendations():
     customer_id = request.form['customer_id']
-    system = EcommerceRecommendationSystem()
     
     try:
-        recs = system.get_recommendations(customer_id)
-        system.close()
+        recs = get_system().get_served_recommendations(customer_id)
         
         if recs:
             return jsonify({
@@ -55,30 +109,62 @@ def generate_recommendations():
         })
     
 
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Enqueue recommendation generation and return the job to follow"""
+    customer_id = request.form.get('customer_id') or (request.get_json(silent=True) or {}).get('customer_id')
+    if not customer_id:
+        return jsonify({'status': 'error', 'message': 'Missing customer_id'}), 400
     
-    # Add new endpoint to generate explanation
-@app.route('/generate_explanation', methods=['POST'])
-def generate_explanation():
-    try:
-        # Get JSON data instead of form data
-        data = request.get_json()
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
-            
-        customer_id = data.get('customer_id')
-        recommendations = data.get('recommendations')
+    job = jobs.submit(customer_id.strip())
+    payload = job.to_dict()
+    payload['quote'] = random.choice(PATIENCE_QUOTES)
+    return jsonify(payload), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Current state of a job, including recommendations once it succeeds"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-sent events stream of a job's progress, ending with its result"""
+    if jobs.get(job_id) is None:
+        return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+    
+    def stream():
+        for snapshot in jobs.watch(job_id):
+            if snapshot is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"data: {json.dumps(snapshot)}\n\n"
+    
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def _explanation_prompt(data):
+    """Build the explanation prompt from the request JSON; returns (prompt, error response)"""
+    if not data:
+        return None, (jsonify({'error': 'No data provided'}), 400)
         
-        if not customer_id or not recommendations:
-            return jsonify({'error': 'Missing required fields'}), 400
+    customer_id = data.get('customer_id')
+    recommendations = data.get('recommendations')
+    
+    if not customer_id or not recommendations:
+        return None, (jsonify({'error': 'Missing required fields'}), 400)
 
-        system = EcommerceRecommendationSystem()
-        customer_data = system.data_handler.get_customer_data(customer_id)
-        system.close()
+    data_handler = get_system().data_handler
+    customer_data = data_handler.get_customer_data(customer_id)
 
-        if not customer_data:
-            return jsonify({'error': 'Customer not found'}), 404
+    if not customer_data:
+        return None, (jsonify({'error': 'Customer not found'}), 404)
+    history = data_handler.get_customer_history(customer_id) or {}
 
-        prompt = f"""
+    prompt = f"""
 Generate a concise 5-10 line explanation for why these products were recommended for customer {customer_id}.
 Focus on key patterns and value propositions. Use this format:
 
@@ -92,23 +178,52 @@ Focus on key patterns and value propositions. Use this format:
 Customer Profile:
 - Age: {customer_data['Age']}
 - Gender: {customer_data['Gender']}
-- Purchase History: {eval(customer_data['Purchase_History'])}
+- Purchase History: {history.get('Purchase_History', [])}
 
 Products: {[f"{r['Product_ID']} ({r['Category']})" for r in recommendations]}
 """
+    return prompt, None
+
+@app.route('/generate_explanation', methods=['POST'])
+def generate_explanation():
+    try:
+        # Get JSON data instead of form data
+        prompt, error = _explanation_prompt(request.get_json())
+        if error:
+            return error
         
-        response = ollama.chat(
-            model='gemma:2b',
-            messages=[{'role': 'user', 'content': prompt}],
-            options={'temperature': 0.7}
-        )
+        explanation = get_llm_client().chat(prompt, options={'temperature': 0.7}, cached=True)
         
         return jsonify({
-            'explanation': response['message']['content']
+            'explanation': explanation
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+@app.route('/generate_explanation/stream', methods=['POST'])
+def stream_explanation():
+    """Server-sent events stream of the explanation as the model writes it"""
+    try:
+        prompt, error = _explanation_prompt(request.get_json(silent=True))
+        if error:
+            return error
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    def stream():
+        # Opening comment flushes headers so the browser sees the first byte immediately
+        yield ": stream-open\n\n"
+        try:
+            for text in get_llm_client().stream(prompt, options={'temperature': 0.7}, cached=True):
+                yield f"data: {json.dumps({'token': text})}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+            return
+        yield "event: done\ndata: {}\n\n"
+    
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
     
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
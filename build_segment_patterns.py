@@ -0,0 +1,27 @@
+# build_segment_patterns.py
+import argparse
+import sqlite3
+from utils.segment_priors import SEGMENT_PATTERNS_PATH, build_segment_patterns, write_segment_patterns
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute segment preference priors from the customers table")
+    parser.add_argument('--db', default='ecommerce.db', help="SQLite database path")
+    parser.add_argument('--output', default=SEGMENT_PATTERNS_PATH, help="Segment patterns JSON file")
+    parser.add_argument('--top-categories', type=int, default=3,
+                        help="Preferred categories kept per segment")
+    parser.add_argument('--min-context-customers', type=int, default=50,
+                        help="Minimum customers for a segment x season x location prior")
+    args = parser.parse_args()
+    
+    conn = sqlite3.connect(args.db)
+    try:
+        patterns = build_segment_patterns(conn, args.top_categories, args.min_context_customers)
+    finally:
+        conn.close()
+    
+    write_segment_patterns(patterns, args.output)
+    contexts = sum(len(entry.get('contexts', {})) for entry in patterns.values())
+    print(f"Wrote {len(patterns)} segments ({contexts} season/location contexts) to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -1,54 +1,82 @@
 # database_updater.py
+import argparse
 import sqlite3
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from fast_recommendations import FastRecommendationEngine
+from utils.bulk_writer import BulkWriter, fast_write_pragmas
+from utils.change_log import ChangeLog
+from utils.parquet_cache import ProductCache
+from utils.recommendation_store import RecommendationStore
 from tqdm import tqdm
 import time
 from datetime import timedelta
 
+# Change-log consumer name of the stored recommendations
+CHANGE_CONSUMER = 'recommendations'
+
+# Per-process engine for --workers mode, memory-mapped from the parent's export
+_worker_engine = None
+
+def _init_worker(shared_dir):
+    global _worker_engine
+    _worker_engine = FastRecommendationEngine.from_shared(shared_dir)
+
+def _recommend_shard(records, top_n):
+    """Score one shard of customers in a worker; returns results and memo counter deltas"""
+    engine = _worker_engine
+    hits, misses = engine.memo_stats['hits'], engine.memo_stats['misses']
+    results = []
+    for record in records:
+        try:
+            recs = engine.recommend_record(record, top_n)
+        except Exception:
+            recs = None
+        results.append((record['Customer_ID'], recs))
+    return results, engine.memo_stats['hits'] - hits, engine.memo_stats['misses'] - misses
+
 class DatabaseUpdater:
-    def __init__(self, db_name='ecommerce.db'):
-        self.engine = FastRecommendationEngine(db_name)
+    def __init__(self, db_name='ecommerce.db', chunk_size=1000, top_n=5, workers=1, shard_size=500,
+                 cache_dir='cache'):
+        # Read the change-log position before loading, so later writes wait for the next run
+        self.change_log = ChangeLog(sqlite3.connect(db_name))
+        self.position = self.change_log.latest()
+        self._rebuild_changed_products(db_name, cache_dir)
+        self.engine = FastRecommendationEngine(db_name, cache_dir)
+        self.store = RecommendationStore(self.engine.conn)
+        self.chunk_size = chunk_size
+        self.top_n = top_n
+        self.workers = workers
+        self.shard_size = shard_size
+        self.writer = None
         self.stats = {
             'processed': 0,
             'skipped': 0,
             'start_time': time.time()
         }
     
-    def _add_recommendation_columns(self):
-        """Ensure recommendation columns exist"""
-        with self.engine.conn as conn:
-            cursor = conn.cursor()
-            cursor.execute("PRAGMA table_info(customers)")
-            columns = [col[1] for col in cursor.fetchall()]
-            
-            for i in range(1, 6):
-                col_name = f"recommendation{i}"
-                if col_name not in columns:
-                    cursor.execute(f"ALTER TABLE customers ADD COLUMN {col_name} TEXT")
-                    print(f"Added column: {col_name}")
+    def _rebuild_changed_products(self, db_name, cache_dir):
+        """Rebuild the product shards if products were logged as changed since the last run
+        
+        Full and incremental runs both read products through the shards, so
+        a logged change forces the rebuild instead of relying on the shard
+        fingerprint alone.
+        """
+        since = self.change_log.checkpoint(CHANGE_CONSUMER)
+        if since is None:
+            return
+        changes = self.change_log.changes(since, self.position)
+        if changes.products or changes.reloaded:
+            ProductCache(db_name, cache_dir).build(self.change_log.conn)
     
-    def _update_customer_recommendations(self, customer_id):
-        """Process recommendations for a single customer"""
+    def _update_customer_recommendations(self, customer_id, recs):
+        """Queue one customer's recommendations for the bulk writer"""
         try:
-            recs = self.engine.get_recommendations(customer_id)
             if not recs:
                 self.stats['skipped'] += 1
                 return None
             
-            # Pad with None if less than 5 recommendations
-            recs += [None] * (5 - len(recs))
-            
-            with self.engine.conn as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                UPDATE customers SET 
-                    recommendation1 = ?,
-                    recommendation2 = ?,
-                    recommendation3 = ?,
-                    recommendation4 = ?,
-                    recommendation5 = ?
-                WHERE Customer_ID = ?
-                """, (*recs[:5], customer_id))
+            self.writer.add_many(self.store.rows_for(customer_id, recs))
             
             self.stats['processed'] += 1
             return recs
@@ -56,6 +84,30 @@ class DatabaseUpdater:
             self.stats['skipped'] += 1
             return None
     
+    def _serial_results(self):
+        """Yield (customer_id, recs) computed in this process"""
+        for customer_id in self.engine.customers['Customer_ID']:
+            yield customer_id, self.engine.get_scored_recommendations(customer_id, self.top_n)
+    
+    def _parallel_results(self):
+        """Yield (customer_id, recs) computed by a pool of worker processes
+        
+        Workers memory-map the product arrays exported by this process instead
+        of re-reading SQLite; this process stays the single writer.
+        """
+        records = self.engine.customer_records()
+        shards = [records[i:i + self.shard_size] for i in range(0, len(records), self.shard_size)]
+        
+        with tempfile.TemporaryDirectory(prefix='recs_shared_') as shared_dir:
+            self.engine.export_shared(shared_dir)
+            with ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                     initargs=(shared_dir,)) as pool:
+                for results, hits, misses in pool.map(_recommend_shard, shards,
+                                                      [self.top_n] * len(shards)):
+                    self.engine.memo_stats['hits'] += hits
+                    self.engine.memo_stats['misses'] += misses
+                    yield from results
+    
     def _print_stats(self):
         """Display current statistics"""
         elapsed = time.time() - self.stats['start_time']
@@ -66,6 +118,8 @@ class DatabaseUpdater:
         print(f"╠{'═'*50}╣")
         print(f"║ {'Processed:':<30} {self.stats['processed']:>18} ║")
         print(f"║ {'Skipped:':<30} {self.stats['skipped']:>18} ║")
+        print(f"║ {'Signature Hits:':<30} {self.engine.memo_stats['hits']:>18} ║")
+        print(f"║ {'Signature Misses:':<30} {self.engine.memo_stats['misses']:>18} ║")
         print(f"║ {'Elapsed Time:':<30} {str(timedelta(seconds=int(elapsed))):>18} ║")
         print(f"║ {'Rate:':<30} {rate:>18.2f} cust/sec ║")
         print(f"╚{'═'*50}╝")
@@ -73,28 +127,101 @@ class DatabaseUpdater:
     def run(self):
         """Execute the full update process"""
         print("🚀 Starting recommendation database update...")
-        self._add_recommendation_columns()
+        run_id = self.store.begin_run()
+        self.engine.reset_signature_memo()
         
         total_customers = len(self.engine.customers)
-        print(f"📊 Processing {total_customers} customers...\n")
+        print(f"📊 Processing {total_customers} customers (run {run_id}, "
+              f"{self.workers} worker{'s' if self.workers > 1 else ''})...\n")
+        
+        # Process with progress bar; rows go to the staging table in chunked transactions
+        conn = self.engine.conn
+        with fast_write_pragmas(conn):
+            with BulkWriter(conn, self.store.insert_sql, self.chunk_size) as self.writer, \
+                 tqdm(total=total_customers, unit='cust', 
+                     bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}]") as pbar:
+                results = self._parallel_results() if self.workers > 1 else self._serial_results()
+                for customer_id, recs in results:
+                    self._update_customer_recommendations(customer_id, recs)
+                    pbar.update(1)
+                    
+                    # Print stats every 100 customers
+                    if pbar.n % 100 == 0:
+                        pbar.write("")  # New line
+                        self._print_stats()
+            
+            # Readers switch from the previous run to this one in a single transaction
+            self.store.commit_run()
+        self.change_log.advance(CHANGE_CONSUMER, self.position)
+        
+        self._finish()
+    
+    def run_incremental(self):
+        """Recompute only customers affected by changes logged since the last run
+        
+        Affected customers are those whose profile changed and those whose
+        candidates can include a changed product. Other customers keep their
+        stored lists, including any drift from model-wide signals (co-purchase
+        counts, lookalikes), until the next full run. Without a previous run,
+        or after a table reload, this falls back to a full run.
+        """
+        since = self.change_log.checkpoint(CHANGE_CONSUMER)
+        if since is None:
+            print("No previous run recorded; running a full update")
+            return self.run()
+        changes = self.change_log.changes(since, self.position)
+        if changes.reloaded:
+            print("Tables were reloaded since the last run; running a full update")
+            return self.run()
+        
+        run_id = self.store.begin_incremental()
+        affected = set(changes.customers)
+        if changes.categories or changes.subcategories:
+            affected.update(self.engine.affected_by(
+                self.engine.customer_records(), changes.categories, changes.subcategories
+            ))
+        print(f"🔄 {len(changes.customers)} changed customers and {changes.products} changed products: "
+              f"recomputing {len(affected)} of {len(self.engine.customers)} customers (run {run_id})\n")
         
-        # Process with progress bar
-        with tqdm(total=total_customers, unit='cust', 
-                 bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}]") as pbar:
-            for _, row in self.engine.customers.iterrows():
-                self._update_customer_recommendations(row['Customer_ID'])
-                pbar.update(1)
-                
-                # Print stats every 100 customers
-                if pbar.n % 100 == 0:
-                    pbar.write("")  # New line
-                    self._print_stats()
+        results = {}
+        for customer_id in tqdm(sorted(affected), unit='cust'):
+            # Deleted customers get an empty list, which removes their stored one
+            recs = None
+            if customer_id in self.engine.customer_rows:
+                recs = self.engine.get_scored_recommendations(customer_id, self.top_n)
+            results[customer_id] = recs
+            self.stats['processed' if recs else 'skipped'] += 1
+        self.store.replace(results)
+        self.change_log.advance(CHANGE_CONSUMER, changes.until)
         
+        self._finish()
+    
+    def _finish(self):
         # Final statistics
         self._print_stats()
         self.engine.close()
+        self.change_log.conn.close()
         print("\n✅ Database update completed successfully!")
 
 if __name__ == "__main__":
-    updater = DatabaseUpdater()
-    updater.run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Write recommendations for every customer")
+    parser.add_argument('--db', default='ecommerce.db', help="SQLite database path")
+    parser.add_argument('--chunk-size', type=int, default=1000,
+                        help="Rows written per transaction")
+    parser.add_argument('--top-n', type=int, default=5,
+                        help="Recommendations stored per customer")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Worker processes used to score customers")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only recompute customers affected by changes since the last run")
+    parser.add_argument('--cache-dir', default='cache',
+                        help="Directory of the product shards and co-occurrence model "
+                             "(the app reads the same files; see CACHE_DIR in app.py)")
+    args = parser.parse_args()
+    
+    updater = DatabaseUpdater(args.db, chunk_size=args.chunk_size, top_n=args.top_n,
+                              workers=args.workers, cache_dir=args.cache_dir)
+    if args.incremental:
+        updater.run_incremental()
+    else:
+        updater.run()
\ No newline at end of file
@@ -123,37 +123,93 @@
 # fast_recommendations.py (Fixed Version)
 import json
 import sqlite3
+from pathlib import Path
 from time import time
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
+from utils.co_occurrence import CO_OCCURRENCE_FILE, CO_PURCHASE_CANDIDATES, CoOccurrenceModel
+from utils.history import HistoryIndex, parse_list
+from utils.lookalike import LookalikeIndex
+from utils.parquet_cache import ProductCache
+from utils.scoring import FAST_WEIGHTS, VectorizedScorer
 
 class FastRecommendationEngine:
-    def __init__(self, db_name: str = 'ecommerce.db') -> None:
+    def __init__(self, db_name: str = 'ecommerce.db', cache_dir: str = 'cache') -> None:
         self.db_name = db_name
+        self.cache_dir = Path(cache_dir)
         self.conn = sqlite3.connect(db_name)
+        self.product_cache = ProductCache(db_name, cache_dir)
         self._load_data()
     
     def _load_data(self) -> None:
         """Load and preprocess all data"""
         self.customers = pd.read_sql("SELECT * FROM customers", self.conn)
-        self.products = pd.read_sql("SELECT * FROM products", self.conn)
+        # Column read of the per-category Parquet shards, rebuilt only when stale
+        self.products = self.product_cache.load(self.conn)
         
         # Get all valid categories
         self.valid_categories = set(self.products['Category'].unique())
+        self.fallback_categories = list(self.valid_categories)[:3]
         
-        # Pre-group products by category
-        self.products_by_category = {
-            cat: group for cat, group in self.products.groupby('Category')
+        # Pre-group product row positions by category
+        self.category_rows = {
+            cat: rows for cat, rows in self.products.groupby('Category').indices.items()
         }
+        self.subcategory_rows = {
+            sub: rows for sub, rows in self.products.groupby('Subcategory').indices.items()
+        }
+        self.product_ids = self.products['Product_ID'].to_numpy()
+        self.customer_rows = {
+            cid: pos for pos, cid in enumerate(self.customers['Customer_ID'])
+        }
+        # Histories are parsed once here; scoring reads the interned lists
+        self.history = HistoryIndex.from_frame(self.customers)
+        self.customer_ids = self.customers['Customer_ID'].tolist()
+        self.order_values = self.customers['Avg_Order_Value'].tolist()
+        self.co_occurrence = CoOccurrenceModel.for_history(
+            self.history, self.cache_dir / CO_OCCURRENCE_FILE
+        )
+        # Customers without usable history borrow from their lookalikes; the
+        # index is built on the first such customer (see lookalikes)
+        self._lookalikes = None
+        
+        # Pre-encode scoring columns once; candidates are scored by row position
+        self.scorer = VectorizedScorer(self.products, FAST_WEIGHTS)
+        
+        # Ranked lists per preference signature, shared by every customer that has it
+        self.reset_signature_memo()
+    
+    @property
+    def lookalikes(self) -> Optional[LookalikeIndex]:
+        """Lookalike index of the customers, built on first use (None for scoring-only engines)"""
+        if self._lookalikes is None and self.customers is not None:
+            self._lookalikes = LookalikeIndex.build(self.customers, self.history, self._donor_rows())
+        return self._lookalikes
+    
+    def _donor_rows(self) -> np.ndarray:
+        """Rows of customers with at least one valid category in their history"""
+        labels = np.asarray(self.history.vocabulary.labels, dtype=object)
+        valid = np.isin(labels, list(self.valid_categories))
+        donor = np.zeros(len(self.history), dtype=bool)
+        for lists in self.history.lists.values():
+            rows = np.repeat(np.arange(len(lists)), np.diff(lists.offsets))
+            donor[rows[valid[lists.codes]]] = True
+        return np.flatnonzero(donor)
+    
+    def reset_signature_memo(self) -> None:
+        """Start a new run: forget memoized signatures and zero the counters"""
+        self.signature_memo = {}
+        self.memo_stats = {'hits': 0, 'misses': 0}
     
     def _get_valid_preferences(self, customer_data: Dict) -> Dict:
         """Get preferences with only valid categories"""
         try:
             # Combine browsing and purchase history
             all_categories = list(set(
-                eval(customer_data['Browsing_History']) + 
-                eval(customer_data['Purchase_History'])
+                self._history_list(customer_data['Browsing_History']) + 
+                self._history_list(customer_data['Purchase_History'])
             ))
             
             # Filter to only categories that exist in products
@@ -162,84 +218,277 @@ class FastRecommendationEngine:
                 if cat in self.valid_categories
             ][:3]  # Use top 3 valid categories
             
+            basket = tuple(sorted(all_categories))
+            if not valid_categories:
+                # No usable history: take the categories of lookalike customers
+                valid_categories = self._lookalike_categories(customer_data)
+                basket = tuple(sorted(valid_categories))
+            
             return {
-                'preferred_categories': valid_categories or list(self.valid_categories)[:3],
+                'preferred_categories': valid_categories or list(self.fallback_categories),
                 'price_range': (
                     'low' if customer_data['Avg_Order_Value'] < 2000 else
                     'high' if customer_data['Avg_Order_Value'] > 5000 else 
                     'medium'
-                )
+                ),
+                # Whole history, for the co-purchase term
+                'basket': basket
             }
         except:
             # Fallback if error occurs
             return {
-                'preferred_categories': list(self.valid_categories)[:3],
-                'price_range': 'medium'
+                'preferred_categories': list(self.fallback_categories),
+                'price_range': 'medium',
+                'basket': ()
             }
     
-    def _score_product(self, product: Dict, preferences: Dict) -> float:
-        """Optimized scoring function"""
-        score = 0.0
-        if product['Category'] in preferences['preferred_categories']:
-            score += 0.4
+    def _lookalike_categories(self, customer_data: Dict) -> List[str]:
+        """Top 3 valid categories shared by a customer's nearest lookalikes"""
+        lookalikes = self.lookalikes
+        if lookalikes is None:
+            return []
+        borrowed = lookalikes.borrow(customer_data)
+        return [item for item in borrowed if item in self.valid_categories][:3]
+    
+    @staticmethod
+    def _history_list(value) -> List[str]:
+        """A history field as a list (records from customer_record() are already parsed)"""
+        return list(parse_list(value)) if isinstance(value, str) else list(value)
+    
+    def customer_record(self, row: int) -> Dict:
+        """Scoring fields of the customer at a row position, with parsed histories"""
+        record = {'Customer_ID': self.customer_ids[row], 'Avg_Order_Value': self.order_values[row]}
+        record.update(self.history.at(row))
+        return record
+    
+    def customer_records(self) -> List[Dict]:
+        """customer_record() for every customer, in table order"""
+        return [self.customer_record(row) for row in range(len(self.customer_ids))]
+    
+    def _top_k(self, scores: np.ndarray, n: int) -> np.ndarray:
+        """Positions of the n best scores, ties broken by candidate order"""
+        if len(scores) > n:
+            top = np.argpartition(scores, -n)[-n:]
+            positions = np.flatnonzero(scores >= scores[top].min())
+        else:
+            positions = np.arange(len(scores))
+        order = np.lexsort((positions, -scores[positions]))
+        return positions[order[:n]]
+    
+    def _rank_products(self, preferences: Dict, n: int) -> Optional[List[Tuple[str, float]]]:
+        """Top-n (product ID, score) pairs from the preferred categories and co-purchased subcategories
         
-        price_range = (
-            'low' if product['Price'] < 1000 else
-            'high' if product['Price'] > 5000 else
-            'medium'
-        )
-        if price_range == preferences['price_range']:
-            score += 0.3
+        Candidates and their scores without the co-purchase term are memoized
+        per (categories, price range) signature; a basket then only adds its
+        subcategories' candidates and the co-purchase term, and the resulting
+        list is kept per basket within the signature.
+        """
+        key = (tuple(preferences['preferred_categories']), preferences['price_range'])
+        if key in self.signature_memo:
+            self.memo_stats['hits'] += 1
+        else:
+            self.memo_stats['misses'] += 1
+            self.signature_memo[key] = self._score_signature(preferences)
         
-        score += product['Product_Rating'] * 0.2
-        score += product['Customer_Review_Sentiment_Score'] * 0.1
-        return score
+        signature = self.signature_memo[key]
+        if signature is None:
+            return None
+        ranked_key = (preferences.get('basket', ()), n)
+        if ranked_key not in signature['ranked']:
+            signature['ranked'][ranked_key] = self._rank_basket(signature, preferences, n)
+        recs = signature['ranked'][ranked_key]
+        # Callers may pad or edit their list, so never hand out the memoized one
+        return list(recs) if recs else None
     
-    def get_recommendations(self, customer_id: str, n: int = 5) -> Optional[List[str]]:
-        """Safe recommendation generation"""
+    def _rank_basket(self, signature: Dict, preferences: Dict, n: int) -> List[Tuple[str, float]]:
+        """Top-n of a signature's candidates plus those of the basket's co-purchased subcategories"""
+        affinity, co_purchased = self._co_purchase(preferences)
+        rows, scores = [signature['rows']], [signature['scores']]
+        # Products of the most co-occurring subcategories join the candidates
+        for sub in co_purchased:
+            if sub not in signature['extra']:
+                signature['extra'][sub] = self._score_extra(preferences, signature['rows'], sub)
+            extra_rows, extra_scores = signature['extra'][sub]
+            rows.append(extra_rows)
+            scores.append(extra_scores)
+        rows, scores = np.concatenate(rows), np.concatenate(scores)
+        if affinity and self.scorer.weights.co_purchase:
+            scores = scores + self.scorer.co_purchase_term(affinity, rows)
+        top = self._top_k(scores, n)
+        return list(zip(self.product_ids[rows[top]].tolist(), scores[top].tolist()))
+    
+    def _score_signature(self, preferences: Dict) -> Optional[Dict]:
+        """Candidate rows of the preferred categories with their scores before the co-purchase term"""
+        rows = [
+            self.category_rows[cat]
+            for cat in preferences['preferred_categories']
+            if cat in self.category_rows
+        ]
+        if not rows:
+            return None
+        
+        rows = np.concatenate(rows)
+        return {
+            'rows': rows,
+            'scores': self.scorer.score(preferences, rows=rows),
+            'extra': {},   # subcategory -> (rows, scores) it adds
+            'ranked': {}   # (basket, n) -> top-n list
+        }
+    
+    def _score_extra(self, preferences: Dict, rows: np.ndarray, sub: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows of a subcategory not already among rows, with their scores before the co-purchase term"""
+        extra = np.asarray(self.subcategory_rows.get(sub, ()), dtype=np.int64)
+        extra = extra[~np.isin(extra, rows)]
+        return extra, self.scorer.score(preferences, rows=extra)
+    
+    def _co_purchase(self, preferences: Dict) -> Tuple[Optional[Dict[str, float]], List[str]]:
+        """Affinity of a customer's basket and the subcategories it adds to the candidates"""
+        if self.co_occurrence is None:
+            return None, []
+        affinity = self.co_occurrence.affinity(preferences.get('basket', ()))
+        return affinity, self.scorer.top_affinity_subcategories(affinity, CO_PURCHASE_CANDIDATES)
+    
+    def affected_by(self, records: Iterable[Dict], categories: Set[str],
+                    subcategories: Set[str]) -> List[str]:
+        """IDs of customers whose candidates can include products of these (sub)categories
+        
+        Checked once per preference signature, so this is a pass over the
+        customers' preferences without any scoring.
+        """
+        memo = {}
+        affected = []
+        for record in records:
+            preferences = self._get_valid_preferences(record)
+            key = (tuple(preferences['preferred_categories']), preferences.get('basket', ()))
+            if key not in memo:
+                memo[key] = (
+                    not categories.isdisjoint(preferences['preferred_categories'])
+                    # A category appearing or disappearing changes which history items are valid
+                    or not categories.isdisjoint(preferences.get('basket', ()))
+                    or not subcategories.isdisjoint(self._co_purchase(preferences)[1])
+                )
+            if memo[key]:
+                affected.append(record['Customer_ID'])
+        return affected
+    
+    def recommend_record(self, customer_data: Dict, n: int = 5) -> Optional[List[Tuple[str, float]]]:
+        """(product ID, score) pairs for a customer row (history and order value fields)"""
+        return self._rank_products(self._get_valid_preferences(customer_data), n)
+    
+    def get_scored_recommendations(self, customer_id: str, n: int = 5) -> Optional[List[Tuple[str, float]]]:
+        """Safe recommendation generation, returning (product ID, score) pairs"""
         try:
-            customer_data = self.customers[
-                self.customers['Customer_ID'] == customer_id
-            ].iloc[0].to_dict()
-            
-            preferences = self._get_valid_preferences(customer_data)
-            
-            # Get products from valid categories
-            product_groups = [
-                self.products_by_category[cat]
-                for cat in preferences['preferred_categories']
-                if cat in self.products_by_category
-            ]
-            
-            if not product_groups:
-                return None
-                
-            candidates = pd.concat(product_groups)
-            candidates['score'] = candidates.apply(
-                lambda row: self._score_product(row.to_dict(), preferences),
-                axis=1
-            )
-            
-            return candidates.sort_values('score', ascending=False)['Product_ID'].head(n).tolist()
+            return self.recommend_record(self.customer_record(self.customer_rows[customer_id]), n)
         except Exception as e:
             print(f"Debug: Error processing {customer_id} - {str(e)}")
             return None
     
-    def generate_all_recommendations(self, output_file: str = "recommendations.json") -> None:
+    def get_recommendations(self, customer_id: str, n: int = 5) -> Optional[List[str]]:
+        """Safe recommendation generation"""
+        scored = self.get_scored_recommendations(customer_id, n)
+        return [product_id for product_id, _ in scored] if scored else None
+    
+    def get_all_recommendations(self, n: int = 5) -> Dict[str, List[str]]:
+        """Recommend for every customer, scoring each distinct preference signature once
+        
+        Customers whose preferences reduce to the same (categories, price range)
+        share one scoring of the catalog; only the co-purchase candidates and
+        term of each customer's basket are added per customer.
+        """
+        self.reset_signature_memo()
+        results = {}
+        for record in tqdm(self.customer_records(), unit='cust'):
+            scored = self._rank_products(self._get_valid_preferences(record), n)
+            if scored:
+                results[record['Customer_ID']] = [product_id for product_id, _ in scored]
+        return results
+    
+    def generate_all_recommendations(self, output_file: str = "recommendations.json",
+                                     batch: bool = True) -> None:
         """Batch process with error handling"""
         results = {}
         print("Processing recommendations...")
         
-        for _, row in tqdm(self.customers.iterrows(), total=len(self.customers)):
-            recs = self.get_recommendations(row['Customer_ID'])
-            if recs:  # Only store if recommendations exist
-                results[row['Customer_ID']] = recs
+        if batch:
+            results = self.get_all_recommendations()
+        else:
+            for _, row in tqdm(self.customers.iterrows(), total=len(self.customers)):
+                recs = self.get_recommendations(row['Customer_ID'])
+                if recs:  # Only store if recommendations exist
+                    results[row['Customer_ID']] = recs
         
         with open(output_file, 'w') as f:
             json.dump(results, f, indent=2)
         
         print(f"\nSuccess! Processed {len(results)}/{len(self.customers)} customers")
         print(f"Results saved to {output_file}")
+    
+    def export_shared(self, directory) -> None:
+        """Write the product arrays needed for scoring to directory for worker processes"""
+        directory = Path(directory)
+        self.scorer.save(directory)
+        np.save(directory / 'product_ids.npy', self.product_ids.astype(str))
+        
+        # Category row positions as one array plus [start, end) offsets
+        offsets = {}
+        for name, groups in (('category', self.category_rows), ('subcategory', self.subcategory_rows)):
+            group_offsets, rows, start = {}, [], 0
+            for key, key_rows in groups.items():
+                group_offsets[key] = [start, start + len(key_rows)]
+                rows.append(key_rows)
+                start += len(key_rows)
+            np.save(directory / f'{name}_rows.npy', np.concatenate(rows))
+            offsets[name] = group_offsets
+        if self.co_occurrence is not None:
+            self.co_occurrence.save(directory / 'co_occurrence.npz')
+        # Workers cannot build the index, so it is built here if any customer will need it
+        if len(self._donor_rows()) < len(self.customer_ids):
+            self.lookalikes.save(directory)
+        with open(directory / 'engine.json', 'w') as f:
+            json.dump({
+                'category_offsets': offsets['category'],
+                'subcategory_offsets': offsets['subcategory'],
+                'valid_categories': sorted(self.valid_categories),
+                'fallback_categories': self.fallback_categories
+            }, f)
+    
+    @classmethod
+    def from_shared(cls, directory) -> 'FastRecommendationEngine':
+        """Scoring-only engine over memory-mapped export_shared() output (no database)"""
+        directory = Path(directory)
+        engine = cls.__new__(cls)
+        engine.db_name = None
+        engine.conn = None
+        engine.customers = None
+        engine.customer_rows = {}
+        engine.history = None
+        engine.customer_ids = []
+        engine.order_values = []
+        
+        with open(directory / 'engine.json') as f:
+            meta = json.load(f)
+        rows = np.load(directory / 'category_rows.npy', mmap_mode='r')
+        engine.category_rows = {
+            cat: rows[start:end] for cat, (start, end) in meta['category_offsets'].items()
+        }
+        rows = np.load(directory / 'subcategory_rows.npy', mmap_mode='r')
+        engine.subcategory_rows = {
+            sub: rows[start:end] for sub, (start, end) in meta['subcategory_offsets'].items()
+        }
+        engine.co_occurrence = CoOccurrenceModel.load(directory / 'co_occurrence.npz')
+        engine._lookalikes = LookalikeIndex.load(directory)
+        engine.valid_categories = set(meta['valid_categories'])
+        engine.fallback_categories = meta['fallback_categories']
+        engine.product_ids = np.load(directory / 'product_ids.npy', mmap_mode='r')
+        engine.scorer = VectorizedScorer.load(directory, FAST_WEIGHTS)
+        engine.reset_signature_memo()
+        return engine
+    
+    def close(self) -> None:
+        """Close database connection"""
+        if self.conn is not None:
+            self.conn.close()
+
 
 if __name__ == "__main__":
     engine = FastRecommendationEngine()
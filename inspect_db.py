@@ -1,5 +1,6 @@
 # inspect_db.py
 import sqlite3
+from utils.schema import explain
 
 def inspect_database(db_name='ecommerce.db'):
     conn = sqlite3.connect(db_name)
@@ -17,6 +18,13 @@ def inspect_database(db_name='ecommerce.db'):
     for column in cursor.fetchall():
         print(column[1])
     
+    # Check the hot queries use indexes rather than full scans
+    print("\nQuery plans:")
+    for name, plan in explain(conn).items():
+        print(f"{name}:")
+        for step in plan:
+            print(f"  {step}")
+    
     conn.close()
 
 if __name__ == "__main__":
@@ -0,0 +1,110 @@
+# llm_stub_server.py
+import argparse
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_PREFERENCES = {
+    'preferred_categories': ['Books', 'Fashion'],
+    'price_range': 'medium',
+    'brand_preferences': [],
+    'style_preferences': [],
+    'seasonal_preferences': []
+}
+
+def make_handler(latency: float, token_delay: float):
+    class StubHandler(BaseHTTPRequestHandler):
+        """Answers POST /api/chat in Ollama's response format after a fixed delay
+
+        Streaming requests get the first word after the delay and each
+        following word token_delay seconds later.
+        """
+
+        def log_message(self, format, *args):
+            pass
+
+        def _message(self, model: str, content: str, done: bool) -> bytes:
+            return json.dumps({
+                'model': model,
+                'created_at': datetime.now(timezone.utc).isoformat(),
+                'message': {'role': 'assistant', 'content': content},
+                'done': done
+            }).encode()
+
+        def do_POST(self):
+            if self.path != '/api/chat':
+                self.send_error(404)
+                return
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            model = request.get('model', 'stub')
+            prompt = request.get('messages', [{}])[-1].get('content', '')
+            if request.get('format') == 'json':
+                content = json.dumps(STUB_PREFERENCES)
+            else:
+                content = f"Stub reply to a {len(prompt)}-character prompt."
+            time.sleep(latency)
+
+            if request.get('stream'):
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.end_headers()
+                for word in content.split(' '):
+                    self.wfile.write(self._message(model, word + ' ', False) + b'\n')
+                    self.wfile.flush()
+                    time.sleep(token_delay)
+                self.wfile.write(self._message(model, '', True) + b'\n')
+                return
+
+            body = self._message(model, content, True)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return StubHandler
+
+def run_bench(host: str, requests: int, concurrency: int):
+    """Drive LLMClient against the server and report throughput"""
+    from utils.llm_client import LLMClient
+
+    client = LLMClient(host=host, max_concurrency=concurrency)
+    prompts = [f"Explain recommendation {i}" for i in range(requests)]
+
+    start = time.time()
+    for prompt in prompts[:min(requests, 20)]:
+        client.chat(prompt)
+    serial = (time.time() - start) / min(requests, 20)
+
+    start = time.time()
+    results = client.map(prompts)
+    elapsed = time.time() - start
+    client.close()
+
+    print(f"Sequential: {serial * 1000:.1f} ms/request")
+    print(f"Concurrent ({concurrency}): {requests} requests in {elapsed:.2f}s "
+          f"({requests / elapsed:.1f} req/s, {sum(r is None for r in results)} failed)")
+    print(f"Client stats: {client.stats}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ollama-compatible stub server for LLM load tests")
+    parser.add_argument('--port', type=int, default=11435)
+    parser.add_argument('--latency', type=float, default=0.2, help="Seconds per response")
+    parser.add_argument('--token-delay', type=float, default=0.05,
+                        help="Seconds between streamed words")
+    parser.add_argument('--bench', type=int, default=0, metavar='N',
+                        help="Run N requests through LLMClient against the stub, then exit")
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(args.latency, args.token_delay))
+    host = f"http://127.0.0.1:{args.port}"
+    if args.bench:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        run_bench(host, args.bench, args.concurrency)
+        server.shutdown()
+    else:
+        print(f"Stub LLM listening on {host} (set OLLAMA_HOST={host})")
+        server.serve_forever()
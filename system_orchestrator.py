@@ -9,21 +9,36 @@ from agents.customer_agent import CustomerAgent
 from agents.product_agent import ProductAgent
 from agents.recommendation_agent import RecommendationAgent
 from utils.data_loader import DataHandler
+from utils.preference_cache import PreferenceCache
+from utils.recommendation_store import PrecomputedIndex
+from utils.segment_priors import SEGMENT_PATTERNS_PATH, PreferenceResolver, SegmentPriors
 
 class EcommerceRecommendationSystem:
-    def __init__(self, db_name='ecommerce.db'):
-        self.data_handler = DataHandler(db_name)
+    def __init__(self, db_name='ecommerce.db', pool=None, preference_cache_path='cache/preferences.db',
+                 precomputed: Optional[PrecomputedIndex] = None,
+                 segment_patterns_path=SEGMENT_PATTERNS_PATH, cache_dir='cache'):
+        # Long-lived instances (e.g. the web app) pass a ConnectionPool so
+        # concurrent requests each check out their own read connection
+        self.data_handler = DataHandler(db_name, pool=pool, cache_dir=cache_dir)
         self.product_agent = ProductAgent(self.data_handler)
+        self.preference_cache = PreferenceCache(preference_cache_path)
+        # Segment priors answer most customers without an LLM round trip
+        self.preference_resolver = PreferenceResolver(SegmentPriors(segment_patterns_path))
+        # Serving mode: answer from the offline batch results when they are fresh
+        self.precomputed = precomputed
     
-    def get_recommendations(self, customer_id: str, n_recommendations: int = 5) -> Optional[Dict]:
-        """Main method to get recommendations for a customer"""
-        customer_agent = CustomerAgent(customer_id, self.data_handler)
+    def get_recommendations(self, customer_id: str, n_recommendations: int = 5,
+                            explain: bool = False) -> Optional[Dict]:
+        """Main method to get recommendations for a customer (explain adds LLM explanations)"""
+        customer_agent = CustomerAgent(
+            customer_id, self.data_handler, self.preference_cache, self.preference_resolver
+        )
         if not customer_agent.profile:
             print(f"Customer {customer_id} not found")
             return None
             
         recommendation_agent = RecommendationAgent(customer_agent, self.product_agent)
-        recommendations = recommendation_agent.generate_recommendations(n_recommendations)
+        recommendations = recommendation_agent.generate_recommendations(n_recommendations, explain=explain)
         
         return {
             'customer_id': customer_id,
@@ -31,8 +46,27 @@ class EcommerceRecommendationSystem:
             'customer_preferences': customer_agent.get_preferences()
         }
     
+    def get_served_recommendations(self, customer_id: str, n_recommendations: int = 5) -> Optional[Dict]:
+        """Serve precomputed recommendations, generating live on a miss or stale entry"""
+        if self.precomputed is not None:
+            with self.data_handler.connection() as conn:
+                self.precomputed.ensure_loaded(conn)
+            recommendations = self.precomputed.get(customer_id, n_recommendations)
+            if recommendations:
+                return {
+                    'customer_id': customer_id,
+                    'recommendations': recommendations,
+                    'source': 'precomputed'
+                }
+        
+        recs = self.get_recommendations(customer_id, n_recommendations)
+        if recs:
+            recs['source'] = 'live'
+        return recs
+    
     def close(self):
         """Clean up resources"""
+        self.preference_cache.close()
         self.data_handler.close()
 
 if __name__ == "__main__":
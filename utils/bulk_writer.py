@@ -0,0 +1,74 @@
+# utils/bulk_writer.py
+import sqlite3
+from contextlib import contextmanager
+from typing import Iterator, List, Sequence
+
+@contextmanager
+def fast_write_pragmas(conn: sqlite3.Connection, synchronous: str = 'NORMAL') -> Iterator[None]:
+    """Use WAL journaling and relaxed fsyncs for a block, restoring the old synchronous level after
+
+    WAL is left on: it persists in the file and lets readers run alongside
+    the writer, and switching journal modes needs the database to itself,
+    which it does not have while e.g. the web app is running. If WAL cannot
+    be enabled for that reason the block runs in the current mode.
+    """
+    sync_level = conn.execute("PRAGMA synchronous").fetchone()[0]
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+    except sqlite3.OperationalError as e:
+        print(f"Warning: could not enable WAL journaling: {e}")
+    conn.execute(f"PRAGMA synchronous = {synchronous}")
+    try:
+        yield
+    finally:
+        conn.execute(f"PRAGMA synchronous = {sync_level}")
+
+class BulkWriter:
+    """Accumulate statement parameters and flush them with executemany
+
+    Every flush of chunk_size rows is a single transaction, so a run costs one
+    commit per chunk instead of one per row.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, sql: str, chunk_size: int = 1000):
+        self.conn = conn
+        self.sql = sql
+        self.chunk_size = chunk_size
+        self.pending: List[Sequence] = []
+        self.rows_written = 0
+        self.flushes = 0
+
+    def add(self, params: Sequence):
+        """Queue one row of parameters, flushing when a chunk is full"""
+        self.pending.append(params)
+        if len(self.pending) >= self.chunk_size:
+            self.flush()
+
+    def add_many(self, rows: Sequence[Sequence]):
+        """Queue several rows of parameters, flushing each time a chunk fills"""
+        self.pending.extend(rows)
+        while len(self.pending) >= self.chunk_size:
+            pending = self.pending
+            self.pending = pending[:self.chunk_size]
+            remainder = pending[self.chunk_size:]
+            self.flush()
+            self.pending = remainder
+
+    def flush(self):
+        """Write all queued rows in one transaction"""
+        if not self.pending:
+            return
+        with self.conn:
+            self.conn.executemany(self.sql, self.pending)
+        self.rows_written += len(self.pending)
+        self.flushes += 1
+        self.pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Only persist the tail of the run if it finished cleanly
+        if exc_type is None:
+            self.flush()
+        return False
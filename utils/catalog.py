@@ -0,0 +1,220 @@
+# utils/catalog.py
+import heapq
+import os
+import sqlite3
+from itertools import islice
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from utils.history import InternedLists, Vocabulary
+from utils.parquet_cache import ProductCache
+from utils.similarity import SimilarityGraph
+from utils.scoring import PRICE_BANDS, price_band_codes
+
+CATEGORICAL_COLUMNS = [
+    'Category', 'Subcategory', 'Brand', 'Holiday', 'Season', 'Geographical_Location'
+]
+NUMERIC_COLUMNS = [
+    'Price', 'Average_Rating_of_Similar_Products', 'Product_Rating',
+    'Customer_Review_Sentiment_Score', 'Probability_of_Recommendation'
+]
+PRODUCT_COLUMNS = [
+    'Product_ID', 'Category', 'Subcategory', 'Price', 'Brand',
+    'Average_Rating_of_Similar_Products', 'Product_Rating', 'Customer_Review_Sentiment_Score',
+    'Holiday', 'Season', 'Geographical_Location', 'Similar_Product_List',
+    'Probability_of_Recommendation'
+]
+
+# Rows kept in each pre-sorted candidate list; deeper requests fall back to a full sort
+CANDIDATE_DEPTH = 500
+
+# Neighbours kept per product in the similar-product graph
+SIMILAR_NEIGHBOURS = 10
+
+def database_version(db_name: str) -> Optional[Tuple]:
+    """File stamp of a database (and its WAL) used to detect changes"""
+    stamp = []
+    for path in (db_name, f"{db_name}-wal"):
+        if os.path.exists(path):
+            stat = os.stat(path)
+            stamp.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(stamp) or None
+
+class ProductCatalog:
+    """The products table held once in memory as compact typed columns
+
+    Rows are sorted by Category so each category is a contiguous row range.
+    Text columns are stored as integer codes into a label array, numeric
+    columns as float32, and a Product_ID -> row map serves point lookups.
+    Each category (and category x price band) also keeps its rows pre-sorted
+    by rating so top-rated candidates are a heap merge of short lists.
+    """
+
+    def __init__(self, db_name: str = 'ecommerce.db', cache_dir='cache'):
+        self.db_name = db_name
+        self.product_cache = ProductCache(db_name, cache_dir)
+        self.version = None
+        self.size = 0
+
+    def _source_version(self) -> Optional[Tuple]:
+        return database_version(self.db_name)
+
+    def load(self, conn: sqlite3.Connection):
+        """Read the products table (via the Parquet shards) into typed arrays"""
+        self.version = self._source_version()
+        products = self.product_cache.load(conn)
+        products = products.sort_values('Category', kind='stable').reset_index(drop=True)
+
+        self.size = len(products)
+        self.product_ids = products['Product_ID'].to_numpy(dtype=object)
+        self.similar_lists = products['Similar_Product_List'].to_numpy(dtype=object)
+        self.similar_items = InternedLists.from_cells(self.similar_lists, Vocabulary())
+
+        self.codes: Dict[str, np.ndarray] = {}
+        self.labels: Dict[str, np.ndarray] = {}
+        for column in CATEGORICAL_COLUMNS:
+            codes, labels = pd.factorize(products[column])
+            self.codes[column] = codes.astype(np.int16)
+            self.labels[column] = np.asarray(labels, dtype=object)
+
+        self.values: Dict[str, np.ndarray] = {}
+        self.integer_columns = set()
+        for column in NUMERIC_COLUMNS:
+            if pd.api.types.is_integer_dtype(products[column]):
+                self.integer_columns.add(column)
+            self.values[column] = products[column].to_numpy(dtype=np.float32)
+
+        self.id_index = {product_id: row for row, product_id in enumerate(self.product_ids)}
+        self.category_ranges = {}
+        for code, label in enumerate(self.labels['Category']):
+            rows = np.flatnonzero(self.codes['Category'] == code)
+            self.category_ranges[label] = (int(rows[0]), int(rows[-1]) + 1)
+        self._build_candidate_index()
+        self.similar_graph = SimilarityGraph.build(
+            self.codes['Subcategory'], self.labels['Subcategory'], self.similar_items,
+            self.values['Product_Rating'], self.values['Customer_Review_Sentiment_Score'],
+            SIMILAR_NEIGHBOURS
+        )
+
+    def _build_candidate_index(self):
+        """(category, price band or None) -> [(-rating, row)] best first, at most CANDIDATE_DEPTH long"""
+        ratings = self.values['Product_Rating']
+        bands = price_band_codes(self.values['Price'].astype(np.float64))
+        self.rated_lists: Dict[Tuple, List[Tuple[float, int]]] = {}
+        for label, (start, end) in self.category_ranges.items():
+            rows = np.arange(start, end)
+            ordered = rows[np.argsort(-ratings[rows], kind='stable')]
+            lists = {None: ordered}
+            for band, code in PRICE_BANDS.items():
+                lists[band] = ordered[bands[ordered] == code]
+            for band, band_rows in lists.items():
+                top = band_rows[:CANDIDATE_DEPTH]
+                self.rated_lists[(label, band)] = list(zip((-ratings[top]).tolist(), top.tolist()))
+
+        # Subcategory -> [(-rating, row)], for candidates drawn from co-purchased subcategories
+        codes = self.codes['Subcategory']
+        ordered = np.argsort(-ratings, kind='stable')
+        self.subcategory_rated_lists: Dict[str, List[Tuple[float, int]]] = {}
+        for code, label in enumerate(self.labels['Subcategory']):
+            top = ordered[codes[ordered] == code][:CANDIDATE_DEPTH]
+            self.subcategory_rated_lists[label] = list(zip((-ratings[top]).tolist(), top.tolist()))
+
+    def __len__(self) -> int:
+        return self.size
+
+    def column(self, name: str, rows=None) -> np.ndarray:
+        """Decoded values of a column for the given rows (all rows by default)"""
+        if rows is None:
+            rows = slice(None)
+        if name in self.codes:
+            codes = self.codes[name][rows]
+            decoded = self.labels[name][np.maximum(codes, 0)]
+            return np.where(codes < 0, None, decoded)
+        if name in self.values:
+            values = self.values[name][rows].astype(np.float64)
+            if name in self.integer_columns:
+                return values.astype(np.int64)
+            # float32 holds ratings to ~7 digits; round away the widening noise
+            return np.round(values, 6)
+        if name == 'Product_ID':
+            return self.product_ids[rows]
+        if name == 'Similar_Product_List':
+            return self.similar_lists[rows]
+        raise KeyError(name)
+
+    def to_frame(self, rows=None) -> pd.DataFrame:
+        """Rows as a DataFrame with the products table's column names"""
+        return pd.DataFrame({name: self.column(name, rows) for name in PRODUCT_COLUMNS})
+
+    def records(self, rows) -> List[Dict]:
+        """Rows as product dicts (same values as get()) without building a DataFrame"""
+        columns = [self.column(name, rows).tolist() for name in PRODUCT_COLUMNS]
+        return [dict(zip(PRODUCT_COLUMNS, values)) for values in zip(*columns)]
+
+    def get(self, product_id: str) -> Optional[Dict]:
+        """One product as a dict, or None if it is not in the catalog"""
+        row = self.id_index.get(product_id)
+        if row is None:
+            return None
+        return {name: self._scalar(name, row) for name in PRODUCT_COLUMNS}
+
+    def _scalar(self, name: str, row: int):
+        value = self.column(name, [row])[0]
+        return value.item() if isinstance(value, np.generic) else value
+
+    def similar_rows(self, product_id: str, k: Optional[int] = None) -> np.ndarray:
+        """Rows of a product's most similar products, best first (empty if unknown)"""
+        row = self.id_index.get(product_id)
+        if row is None:
+            return np.empty(0, dtype=np.int32)
+        return self.similar_graph.neighbours_of(row, k)
+
+    def more_like_this_rows(self, product_ids: Iterable[str], limit: int) -> np.ndarray:
+        """Rows similar to any of the given products, excluding them"""
+        rows = [self.id_index[pid] for pid in product_ids if pid in self.id_index]
+        return self.similar_graph.expand(rows, limit)
+
+    def category_rows(self, categories: Optional[Iterable[str]] = None) -> np.ndarray:
+        """Row positions of the given categories (every row when None)"""
+        if categories is None:
+            return np.arange(self.size)
+        ranges = [
+            self.category_ranges[cat]
+            for cat in dict.fromkeys(categories)
+            if isinstance(cat, str) and cat in self.category_ranges
+        ]
+        if not ranges:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([np.arange(start, end) for start, end in ranges])
+
+    def top_rated_rows(self, categories: Iterable[str], limit: int,
+                       price_range: Optional[str] = None) -> np.ndarray:
+        """Rows of the given categories (optionally one price band) ordered by Product_Rating, best first
+
+        Ties keep the order of the categories as given, then catalog order.
+        """
+        categories = [cat for cat in dict.fromkeys(categories)
+                      if isinstance(cat, str) and cat in self.category_ranges]
+        if limit > CANDIDATE_DEPTH:
+            rows = self.category_rows(categories)
+            if price_range is not None:
+                bands = price_band_codes(self.values['Price'][rows].astype(np.float64))
+                rows = rows[bands == PRICE_BANDS[price_range]]
+            order = np.argsort(-self.values['Product_Rating'][rows], kind='stable')
+            return rows[order[:limit]]
+
+        # heapq.merge is stable, so equal ratings come out in category order
+        lists = [self.rated_lists[(cat, price_range)] for cat in categories]
+        merged = heapq.merge(*lists, key=itemgetter(0))
+        return np.fromiter((row for _, row in islice(merged, limit)), dtype=np.int64)
+
+    def top_rated_subcategory_rows(self, subcategories: Iterable[str], limit: int) -> np.ndarray:
+        """Rows of the given subcategories ordered by Product_Rating, best first
+
+        Draws on at most CANDIDATE_DEPTH rows per subcategory.
+        """
+        lists = [self.subcategory_rated_lists[sub] for sub in dict.fromkeys(subcategories)
+                 if sub in self.subcategory_rated_lists]
+        merged = heapq.merge(*lists, key=itemgetter(0))
+        return np.fromiter((row for _, row in islice(merged, limit)), dtype=np.int64)
@@ -0,0 +1,165 @@
+# utils/change_log.py
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from typing import Optional, Set
+
+CHANGE_LOG_TABLE = 'change_log'
+CHECKPOINT_TABLE = 'change_log_checkpoints'
+
+# Columns that feed recommendations; writes touching only other columns are not logged
+CUSTOMER_INPUT_COLUMNS = (
+    'Age', 'Gender', 'Location', 'Browsing_History', 'Purchase_History',
+    'Customer_Segment', 'Avg_Order_Value', 'Season'
+)
+PRODUCT_INPUT_COLUMNS = (
+    'Category', 'Subcategory', 'Price', 'Brand', 'Product_Rating', 'Customer_Review_Sentiment_Score'
+)
+
+SCHEMA = f'''
+    CREATE TABLE IF NOT EXISTS {CHANGE_LOG_TABLE} (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        entity TEXT NOT NULL,
+        entity_id TEXT,
+        category TEXT,
+        subcategory TEXT,
+        changed_at REAL NOT NULL DEFAULT ((julianday('now') - 2440587.5) * 86400.0)
+    );
+    CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE} (
+        consumer TEXT PRIMARY KEY,
+        seq INTEGER NOT NULL,
+        updated_at REAL
+    );
+'''
+
+# Products log their category / subcategory before and after, so both sides of a move count
+TRIGGERS = {
+    'customers': [
+        ('customers_insert_log', 'AFTER INSERT', "('customer', NEW.Customer_ID, NULL, NULL)"),
+        ('customers_update_log', f"AFTER UPDATE OF {', '.join(CUSTOMER_INPUT_COLUMNS)}",
+         "('customer', NEW.Customer_ID, NULL, NULL), ('customer', OLD.Customer_ID, NULL, NULL)"),
+        ('customers_delete_log', 'AFTER DELETE', "('customer', OLD.Customer_ID, NULL, NULL)")
+    ],
+    'products': [
+        ('products_insert_log', 'AFTER INSERT',
+         "('product', NEW.Product_ID, NEW.Category, NEW.Subcategory)"),
+        ('products_update_log', f"AFTER UPDATE OF {', '.join(PRODUCT_INPUT_COLUMNS)}",
+         "('product', NEW.Product_ID, NEW.Category, NEW.Subcategory), "
+         "('product', OLD.Product_ID, OLD.Category, OLD.Subcategory)"),
+        ('products_delete_log', 'AFTER DELETE',
+         "('product', OLD.Product_ID, OLD.Category, OLD.Subcategory)")
+    ]
+}
+
+@dataclass
+class ChangeSet:
+    """What changed between two change-log positions"""
+    until: int
+    customers: Set[str] = field(default_factory=set)
+    categories: Set[str] = field(default_factory=set)
+    subcategories: Set[str] = field(default_factory=set)
+    products: int = 0
+    # A table was reloaded wholesale, or entries were pruned before this
+    # reader saw them, so everything must be recomputed
+    reloaded: bool = False
+
+    def __bool__(self) -> bool:
+        return bool(self.customers or self.products or self.reloaded)
+
+def _table_exists(conn: sqlite3.Connection, table: str) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone() is not None
+
+def ensure_change_log(conn: sqlite3.Connection):
+    """Create the change log and (re)attach its triggers to the data tables
+
+    Bulk loads drop and recreate the tables, which drops the triggers too;
+    apply_schema() runs this again after every load.
+    """
+    conn.executescript(SCHEMA)
+    for table, triggers in TRIGGERS.items():
+        if not _table_exists(conn, table):
+            continue
+        for name, event, values in triggers:
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {name} {event} ON {table}
+                BEGIN
+                    INSERT INTO {CHANGE_LOG_TABLE} (entity, entity_id, category, subcategory)
+                    VALUES {values};
+                END
+            ''')
+    conn.commit()
+
+def log_reload(conn: sqlite3.Connection, table: str):
+    """Record that a table was replaced wholesale (e.g. by a CSV load)"""
+    with conn:
+        conn.execute(f"INSERT INTO {CHANGE_LOG_TABLE} (entity, entity_id) VALUES ('reload', ?)", (table,))
+
+class ChangeLog:
+    """Reader of the change log with per-consumer checkpoints
+
+    A consumer reads the changes after its checkpoint, processes them and
+    then advances the checkpoint to the position it read up to.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, create: bool = True):
+        self.conn = conn
+        if create:
+            ensure_change_log(conn)
+
+    def latest(self) -> int:
+        """Position of the newest entry; never moves back, even once entries are pruned"""
+        row = self.conn.execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = ?", (CHANGE_LOG_TABLE,)
+        ).fetchone()
+        return 0 if row is None else row[0]
+
+    def checkpoint(self, consumer: str) -> Optional[int]:
+        """Position a consumer has processed up to (None if it never ran)"""
+        row = self.conn.execute(
+            f"SELECT seq FROM {CHECKPOINT_TABLE} WHERE consumer = ?", (consumer,)
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def changes(self, since: int, until: Optional[int] = None) -> ChangeSet:
+        """Changed customers, product categories and reloads in (since, until]
+
+        Positions are consecutive, so fewer entries than until - since means
+        some were pruned by advance() and the set is reported as a reload.
+        """
+        until = self.latest() if until is None else until
+        changes = ChangeSet(until)
+        logged = self.conn.execute(
+            f"SELECT COUNT(*) FROM {CHANGE_LOG_TABLE} WHERE seq > ? AND seq <= ?", (since, until)
+        ).fetchone()[0]
+        if logged < until - since:
+            changes.reloaded = True
+        cursor = self.conn.execute(f'''
+            SELECT DISTINCT entity, entity_id, category, subcategory FROM {CHANGE_LOG_TABLE}
+            WHERE seq > ? AND seq <= ?
+        ''', (since, until))
+        for entity, entity_id, category, subcategory in cursor:
+            if entity == 'customer':
+                changes.customers.add(entity_id)
+            elif entity == 'product':
+                changes.products += 1
+                if category is not None:
+                    changes.categories.add(category)
+                if subcategory is not None:
+                    changes.subcategories.add(subcategory)
+            else:
+                changes.reloaded = True
+        return changes
+
+    def advance(self, consumer: str, seq: int):
+        """Move a consumer's checkpoint and drop entries every consumer has processed"""
+        with self.conn:
+            self.conn.execute(f'''
+                INSERT INTO {CHECKPOINT_TABLE} (consumer, seq, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(consumer) DO UPDATE SET seq = excluded.seq, updated_at = excluded.updated_at
+            ''', (consumer, seq, time.time()))
+            self.conn.execute(f'''
+                DELETE FROM {CHANGE_LOG_TABLE}
+                WHERE seq <= (SELECT MIN(seq) FROM {CHECKPOINT_TABLE})
+            ''')
@@ -0,0 +1,167 @@
+# utils/co_occurrence.py
+import copy
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+import scipy.sparse as sp
+from utils.history import HistoryIndex
+
+# Written by the batch updater into its cache directory
+CO_OCCURRENCE_FILE = 'co_occurrence.npz'
+CO_OCCURRENCE_PATH = f'cache/{CO_OCCURRENCE_FILE}'
+
+# Top-affinity subcategories whose products the engines add to their candidates
+CO_PURCHASE_CANDIDATES = 3
+
+class CoOccurrenceModel:
+    """Item-item co-occurrence of customers' histories as a sparse count matrix
+
+    Items are the labels of Browsing_History and Purchase_History together
+    (categories and subcategories). counts[i, j] is the number of customers
+    whose history holds both i and j, and the diagonal holds each item's own
+    customer count. Similarity is cosine, counts[i, j] / sqrt(n_i * n_j).
+    Each item's top-k neighbours are kept as sorted CSR arrays, so a
+    neighbour query is one slice.
+    """
+
+    def __init__(self, labels: Sequence[str], counts: sp.csr_matrix, k: int = 20,
+                 fingerprint: Optional[str] = None):
+        self.labels = list(labels)
+        self.index = {label: code for code, label in enumerate(self.labels)}
+        self.counts = counts.tocsr()
+        self.k = k
+        self.fingerprint = fingerprint
+        self._rank()
+
+    @classmethod
+    def build(cls, history: HistoryIndex, k: int = 20) -> 'CoOccurrenceModel':
+        """Count co-occurrences over every customer in a history index"""
+        size = len(history.vocabulary.labels)
+        incidence = None
+        for lists in history.lists.values():
+            matrix = sp.csr_matrix(
+                (np.ones(len(lists.codes), dtype=np.int64), lists.codes, lists.offsets),
+                shape=(len(lists), size)
+            )
+            incidence = matrix if incidence is None else incidence + matrix
+        incidence.data[:] = 1  # an item counts once per customer
+        counts = (incidence.T @ incidence).tocsr()
+        return cls(history.vocabulary.labels, counts, k, history.fingerprint())
+
+    def _incidence(self, baskets: Iterable[Iterable[str]]) -> sp.csr_matrix:
+        """Customers x items 0/1 matrix of baskets, interning unseen labels"""
+        rows, cols = [], []
+        for row, basket in enumerate(baskets):
+            for label in dict.fromkeys(basket):
+                if label not in self.index:
+                    self.index[label] = len(self.labels)
+                    self.labels.append(label)
+                rows.append(row)
+                cols.append(self.index[label])
+        shape = ((rows[-1] + 1) if rows else 0, len(self.labels))
+        return sp.csr_matrix((np.ones(len(rows), dtype=np.int64), (rows, cols)), shape=shape)
+
+    def update(self, removed: Iterable[Iterable[str]] = (), added: Iterable[Iterable[str]] = ()):
+        """Apply changed histories: subtract their old baskets, add the new ones"""
+        removed = self._incidence(removed)
+        added = self._incidence(added)
+        size = len(self.labels)
+        counts = self.counts.copy()
+        counts.resize((size, size))  # room for newly seen items
+        for matrix, sign in ((removed, -1), (added, 1)):
+            if matrix.nnz:
+                matrix.resize(matrix.shape[0], size)
+                counts = counts + sign * (matrix.T @ matrix)
+        counts.eliminate_zeros()
+        self.counts = counts.tocsr()
+        self.fingerprint = None
+        self._rank()
+
+    def updated(self, removed: Iterable[Iterable[str]] = (),
+                added: Iterable[Iterable[str]] = ()) -> 'CoOccurrenceModel':
+        """Copy with changed histories applied (see update); this model is left as it was"""
+        model = copy.copy(self)
+        model.labels = list(self.labels)
+        model.index = dict(self.index)
+        model.update(removed, added)
+        return model
+
+    def _rank(self):
+        """Top-k cosine neighbours of every item, best first"""
+        counts = self.counts.tocoo()
+        totals = self.counts.diagonal().astype(np.float64)
+        off_diagonal = (counts.row != counts.col) & (counts.data > 0)
+        rows, cols = counts.row[off_diagonal], counts.col[off_diagonal]
+        scores = counts.data[off_diagonal] / np.sqrt(totals[rows] * totals[cols])
+
+        # Sort by item, then score descending (then neighbour code), and keep k per item
+        order = np.lexsort((cols, -scores, rows))
+        rows, cols, scores = rows[order], cols[order], scores[order]
+        starts = np.searchsorted(rows, np.arange(len(self.labels) + 1))
+        keep = np.arange(len(rows)) - starts[rows] < self.k
+        rows, self.neighbour_items, self.neighbour_scores = rows[keep], cols[keep], scores[keep]
+        self.neighbour_offsets = np.searchsorted(rows, np.arange(len(self.labels) + 1))
+
+    def neighbours(self, item: str, k: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Items most often found together with item, with their cosine scores"""
+        code = self.index.get(item)
+        if code is None:
+            return []
+        start, end = self.neighbour_offsets[code], self.neighbour_offsets[code + 1]
+        if k is not None:
+            end = min(end, start + k)
+        labels = self.labels
+        return [(labels[other], score) for other, score in
+                zip(self.neighbour_items[start:end].tolist(), self.neighbour_scores[start:end].tolist())]
+
+    def affinity(self, basket: Iterable[str]) -> Dict[str, float]:
+        """Co-occurrence affinity of every neighbouring item to a basket, scaled to a max of 1"""
+        totals: Dict[str, float] = {}
+        for item in dict.fromkeys(basket):
+            for other, score in self.neighbours(item):
+                totals[other] = totals.get(other, 0.0) + score
+        if not totals:
+            return {}
+        top = max(totals.values())
+        return {item: score / top for item, score in totals.items()}
+
+    def save(self, path=CO_OCCURRENCE_PATH):
+        """Persist counts and labels (the neighbour lists are rebuilt on load)"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp.npz')
+        counts = self.counts.tocsr()
+        np.savez(tmp_path, data=counts.data, indices=counts.indices, indptr=counts.indptr,
+                 meta=np.array(json.dumps({
+                     'labels': self.labels, 'k': self.k, 'fingerprint': self.fingerprint
+                 })))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=CO_OCCURRENCE_PATH) -> Optional['CoOccurrenceModel']:
+        """Model saved at path, or None if there is none"""
+        if not Path(path).exists():
+            return None
+        with np.load(path) as saved:
+            meta = json.loads(str(saved['meta']))
+            size = len(meta['labels'])
+            counts = sp.csr_matrix((saved['data'], saved['indices'], saved['indptr']), shape=(size, size))
+        return cls(meta['labels'], counts, meta['k'], meta['fingerprint'])
+
+    @classmethod
+    def for_history(cls, history: HistoryIndex, path=CO_OCCURRENCE_PATH, k: int = 20,
+                    save: bool = True) -> 'CoOccurrenceModel':
+        """The persisted model if it was built from these histories, else a fresh build
+
+        Only the owner of the file (the batch updater) saves the fresh build;
+        other processes pass save=False and just read it when it matches.
+        """
+        model = cls.load(path)
+        if model is not None and model.k == k and model.fingerprint == history.fingerprint():
+            return model
+        model = cls.build(history, k)
+        if save:
+            model.save(path)
+        return model
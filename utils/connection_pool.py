@@ -0,0 +1,79 @@
+# utils/connection_pool.py
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+class ConnectionPool:
+    """Thread-safe SQLite connections: at most max_readers pooled readers plus a single writer
+
+    Readers are checked out for the duration of a `with pool.reader()`
+    block and returned afterwards, so short-lived request threads share a
+    bounded set of connections instead of each keeping its own open.
+    """
+
+    def __init__(self, db_name: str = 'ecommerce.db', max_readers: int = 8, timeout: float = 30.0):
+        self.db_name = db_name
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_readers)
+        self._readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        self._writer: Optional[sqlite3.Connection] = None
+        self._writer_lock = threading.RLock()
+        self._closed = False
+
+    def _connect(self) -> sqlite3.Connection:
+        # A reader is used by whichever thread checked it out, and close()
+        # runs on the shutdown thread, so the same-thread check is relaxed
+        conn = sqlite3.connect(self.db_name, check_same_thread=False)
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """Check out a read connection, waiting up to timeout when all are in use"""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f"No reader connection free after {self.timeout}s")
+        try:
+            if self._closed:
+                raise RuntimeError("Connection pool is closed")
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+                with self._readers_lock:
+                    self._readers.append(conn)
+            try:
+                yield conn
+            finally:
+                if not self._closed:
+                    if conn.in_transaction:
+                        conn.rollback()
+                    self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """Serialize access to the writer connection, committing on success"""
+        with self._writer_lock:
+            if self._closed:
+                raise RuntimeError("Connection pool is closed")
+            if self._writer is None:
+                self._writer = self._connect()
+            with self._writer:
+                yield self._writer
+
+    def close(self):
+        """Close every connection opened by the pool"""
+        with self._writer_lock:
+            self._closed = True
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        with self._readers_lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers.clear()
@@ -0,0 +1,89 @@
+# utils/csv_ingest.py
+import json
+import sqlite3
+from functools import lru_cache
+from typing import Dict, List, Optional
+import pandas as pd
+from utils.bulk_writer import BulkWriter, fast_write_pragmas
+from utils.history import parse_list
+
+# Stored as JSON arrays; parse_list reads these and the legacy "['a', 'b']" form alike
+LIST_COLUMNS = ('Browsing_History', 'Purchase_History', 'Similar_Product_List')
+
+SQL_TYPES = {'i': 'INTEGER', 'u': 'INTEGER', 'f': 'REAL', 'b': 'INTEGER'}
+
+@lru_cache(maxsize=65536)
+def normalize_list(value) -> str:
+    """Canonical JSON array for a "['a', 'b']" cell (bad or missing values become [])"""
+    return json.dumps(list(parse_list(value)))
+
+def _columns(csv_path) -> List[str]:
+    """Header columns, skipping the empty trailing ones the exports end with"""
+    header = pd.read_csv(csv_path, nrows=0).columns
+    return [col for col in header if col.strip() and not col.startswith('Unnamed')]
+
+def ingest_csv(conn: sqlite3.Connection, csv_path, table: str, primary_key: Optional[str] = None,
+               chunk_size: int = 50000) -> Dict:
+    """Replace a table with a CSV's contents, streaming it in chunks of chunk_size rows
+
+    Memory stays bounded by one chunk. Column types come from the first
+    chunk, list columns are normalized once on the way in, and rows are
+    written with executemany, one transaction per chunk, under relaxed
+    journaling. Rows go into a staging table that replaces the live one
+    only once every chunk is in, so a failed load leaves the old table
+    intact. If primary_key turns out to have duplicates the load is redone
+    without the key and apply_schema() indexes the column instead.
+    """
+    try:
+        return _load(conn, csv_path, table, primary_key, chunk_size)
+    except sqlite3.IntegrityError:
+        if primary_key is None:
+            raise
+        print(f"Warning: duplicate {primary_key} values in {csv_path}; loading {table} without a key")
+        return _load(conn, csv_path, table, None, chunk_size)
+
+def _load(conn: sqlite3.Connection, csv_path, table: str, primary_key: Optional[str],
+          chunk_size: int) -> Dict:
+    columns = _columns(csv_path)
+    names = [col.strip() for col in columns]
+    reader = pd.read_csv(csv_path, usecols=columns, chunksize=chunk_size)
+    staging = f"{table}_staging"
+
+    rows = 0
+    writer = None
+    with fast_write_pragmas(conn, synchronous='OFF'):
+        try:
+            for chunk in reader:
+                chunk = chunk[columns]
+                chunk.columns = names
+                if writer is None:
+                    definitions = [
+                        f'"{name}" {SQL_TYPES.get(chunk[name].dtype.kind, "TEXT")}'
+                        + (" PRIMARY KEY" if name == primary_key else "")
+                        for name in names
+                    ]
+                    with conn:
+                        conn.execute(f'DROP TABLE IF EXISTS "{staging}"')
+                        conn.execute(f'CREATE TABLE "{staging}" ({", ".join(definitions)})')
+                    placeholders = ', '.join('?' * len(names))
+                    writer = BulkWriter(conn, f'INSERT INTO "{staging}" VALUES ({placeholders})', chunk_size)
+
+                for name in LIST_COLUMNS:
+                    if name in chunk:
+                        chunk[name] = chunk[name].map(normalize_list)
+                values = chunk.astype(object).where(chunk.notna(), None)
+                writer.add_many(list(values.itertuples(index=False, name=None)))
+                rows += len(chunk)
+            if writer is not None:
+                writer.flush()
+        except BaseException:
+            with conn:
+                conn.execute(f'DROP TABLE IF EXISTS "{staging}"')
+            raise
+
+        # Swap the complete table in with one transaction
+        if writer is not None:
+            with conn:
+                conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+                conn.execute(f'ALTER TABLE "{staging}" RENAME TO "{table}"')
+    return {'table': table, 'rows': rows, 'columns': names}
@@ -1,22 +1,164 @@
 # utils/data_loader.py
 import pandas as pd
 import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Tuple
 from pathlib import Path
 import json
+from utils.catalog import ProductCatalog, database_version
+from utils.change_log import ChangeLog, ensure_change_log, log_reload
+from utils.co_occurrence import CO_OCCURRENCE_FILE, CoOccurrenceModel
+from utils.csv_ingest import ingest_csv
+from utils.history import HISTORY_COLUMNS, HistoryIndex
+from utils.schema import apply_schema, explain, schema_missing
+
+# Changed customers applied to the in-memory indexes row by row; more than this rebuilds them
+HISTORY_UPDATE_LIMIT = 1000
 
 class DataHandler:
-    def __init__(self, db_name='ecommerce.db'):
+    def __init__(self, db_name='ecommerce.db', pool=None, cache_dir='cache'):
         self.db_name = db_name
-        self.conn = None
+        self.pool = pool
+        # Product shards and the co-occurrence model, shared with the batch updater
+        self.cache_dir = Path(cache_dir)
+        self._conn = None
+        self._catalog = None
+        self._catalog_stamp = None
+        self._catalog_position = None
+        self._catalog_lock = threading.Lock()
+        self._indexes = None  # (history, co-occurrence)
+        self._indexes_stamp = None
+        self._indexes_position = None
+        self._indexes_lock = threading.Lock()
         self._initialize_db()
-        
+
+    @contextmanager
+    def connection(self):
+        """Read connection for the duration of a with block (checked out of the pool when pooled)"""
+        if self.pool is not None:
+            with self.pool.reader() as conn:
+                yield conn
+        else:
+            yield self._conn
+
+    @contextmanager
+    def write_connection(self):
+        """Connection for writes, committed at the end of the with block"""
+        if self.pool is not None:
+            with self.pool.writer() as conn:
+                yield conn
+        else:
+            with self._conn:
+                yield self._conn
+
+    def _logged_changes(self, conn, since):
+        """Latest change-log position and the changes after since (None when since is None)"""
+        log = ChangeLog(conn, create=False)
+        position = log.latest()
+        return position, (None if since is None else log.changes(since, position))
+
+    @property
+    def catalog(self) -> ProductCatalog:
+        """In-memory product catalog, replaced by a fresh load when products change
+
+        An unchanged file stamp is the cheap check; once it moves, the change
+        log tells whether products (rather than other tables) were written.
+        """
+        with self._catalog_lock:
+            catalog = self._catalog
+            stamp = database_version(self.db_name)
+            if catalog is None or stamp != self._catalog_stamp:
+                with self.connection() as conn:
+                    position, changes = self._logged_changes(conn, self._catalog_position)
+                    if changes is None or changes.products or changes.reloaded:
+                        catalog = ProductCatalog(self.db_name, self.cache_dir)
+                        catalog.load(conn)
+                        # Swap only a fully loaded catalog in; readers keep the one they hold
+                        self._catalog = catalog
+                self._catalog_stamp = stamp
+                self._catalog_position = position
+        return catalog
+
+    @property
+    def history(self) -> HistoryIndex:
+        """Pre-parsed customer histories, kept in step with the customers table"""
+        return self._customer_indexes()[0]
+
+    @property
+    def co_occurrence(self) -> CoOccurrenceModel:
+        """Item-item co-occurrence of the customer histories, kept in step with them
+
+        The batch updater owns co_occurrence.npz in the cache directory; it is
+        reused here when it matches the histories, but rebuilds and updates
+        stay in memory.
+        """
+        return self._customer_indexes()[1]
+
+    def _customer_indexes(self) -> Tuple[HistoryIndex, CoOccurrenceModel]:
+        """History index and co-occurrence model as of the latest customer changes
+
+        An unchanged file stamp is the cheap check. Once it moves, the change
+        log tells which customers were written: a few are applied to copies
+        of both indexes row by row, a reload or many changes rebuild them,
+        and writes to other tables keep them as they are.
+        """
+        with self._indexes_lock:
+            stamp = database_version(self.db_name)
+            if self._indexes is None or stamp != self._indexes_stamp:
+                with self.connection() as conn:
+                    position, changes = self._logged_changes(conn, self._indexes_position)
+                    if changes is None or changes.reloaded or len(changes.customers) > HISTORY_UPDATE_LIMIT:
+                        history = HistoryIndex.load(conn, position)
+                        model = CoOccurrenceModel.for_history(
+                            history, self.cache_dir / CO_OCCURRENCE_FILE, save=False
+                        )
+                        self._indexes = (history, model)
+                    elif changes.customers:
+                        self._indexes = self._apply_customer_changes(conn, changes.customers, position)
+                self._indexes_stamp = stamp
+                self._indexes_position = position
+            return self._indexes
+
+    def _apply_customer_changes(self, conn, customer_ids, position) -> Tuple[HistoryIndex, CoOccurrenceModel]:
+        """Copies of the current indexes with the given customers re-read from the database"""
+        history, model = self._indexes
+        customer_ids = sorted(customer_ids)
+        cells = {}
+        for start in range(0, len(customer_ids), 500):
+            batch = customer_ids[start:start + 500]
+            rows = conn.execute(
+                f"SELECT Customer_ID, {', '.join(HISTORY_COLUMNS)} FROM customers "
+                f"WHERE Customer_ID IN ({', '.join('?' * len(batch))})", batch
+            )
+            for customer_id, *values in rows:
+                cells[customer_id] = dict(zip(HISTORY_COLUMNS, values))
+        updated = history.updated({customer_id: cells.get(customer_id) for customer_id in customer_ids},
+                                  position)
+
+        def baskets(index):
+            return [
+                [item for name in HISTORY_COLUMNS for item in lists[name]]
+                for lists in map(index.get, customer_ids) if lists is not None
+            ]
+        return updated, model.updated(removed=baskets(history), added=baskets(updated))
+
     def _initialize_db(self):
         """Initialize SQLite database and tables"""
-        self.conn = sqlite3.connect(self.db_name)
-        self.conn.execute("PRAGMA foreign_keys = ON")
-        
-        # Create tables if they don't exist
-        self.conn.execute('''
+        if self.pool is not None:
+            # Shared pools run the DDL once, through the single writer
+            with self.pool.writer() as conn:
+                self._create_tables(conn)
+            return
+
+        self._conn = sqlite3.connect(self.db_name)
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        self._create_tables(self._conn)
+        self._conn.commit()
+
+    def _create_tables(self, conn):
+        """Create tables if they don't exist"""
+        conn.execute('''
             CREATE TABLE IF NOT EXISTS products (
                 Product_ID TEXT PRIMARY KEY,
                 Category TEXT,
@@ -34,7 +176,7 @@ class DataHandler:
             )
         ''')
         
-        self.conn.execute('''
+        conn.execute('''
             CREATE TABLE IF NOT EXISTS customers (
                 Customer_ID TEXT PRIMARY KEY,
                 Age INTEGER,
@@ -48,24 +190,33 @@ class DataHandler:
                 Season TEXT
             )
         ''')
-        self.conn.commit()
+        
+        # Profile and product writes are logged for the incremental updater
+        ensure_change_log(conn)
+        
+        # One-time migration of databases built before keys and indexes were applied
+        if schema_missing(conn):
+            print("Applying schema:", apply_schema(conn))
     
-    def load_csv_to_db(self, product_csv, customer_csv):
-        """Load data from CSV files to SQLite database"""
+    def load_csv_to_db(self, product_csv, customer_csv, chunk_size=50000):
+        """Load data from CSV files to SQLite database (streamed in chunks)"""
         try:
-            # Load product data
-            products = pd.read_csv(product_csv)
-            products.columns = products.columns.str.strip()  # Clean column names
-            products.to_sql('products', self.conn, if_exists='replace', index=False)
-            
-            # Load customer data
-            customers = pd.read_csv(customer_csv)
-            customers.columns = customers.columns.str.strip()  # Clean column names
-            customers.to_sql('customers', self.conn, if_exists='replace', index=False)
+            with self.write_connection() as conn:
+                # Load product data
+                products = ingest_csv(conn, product_csv, 'products', 'Product_ID', chunk_size)
+                
+                # Load customer data
+                customers = ingest_csv(conn, customer_csv, 'customers', 'Customer_ID', chunk_size)
+                
+                # Secondary indexes are cheaper to build once the rows are in
+                schema = apply_schema(conn)
+                for table in ('products', 'customers'):
+                    log_reload(conn, table)
             
-            print(f"Successfully loaded {len(products)} products and {len(customers)} customers")
-            print("Product columns:", products.columns.tolist())
-            print("Customer columns:", customers.columns.tolist())
+            print(f"Successfully loaded {products['rows']} products and {customers['rows']} customers")
+            print("Schema:", schema)
+            print("Product columns:", products['columns'])
+            print("Customer columns:", customers['columns'])
             return True
         except Exception as e:
             print(f"Error loading data: {e}")
@@ -74,8 +225,9 @@ class DataHandler:
     
     def get_customer_data(self, customer_id):
         """Retrieve customer data by ID with error handling"""
-        query = f"SELECT * FROM customers WHERE Customer_ID = '{customer_id}'"
-        result = pd.read_sql(query, self.conn)
+        query = "SELECT * FROM customers WHERE Customer_ID = ?"
+        with self.connection() as conn:
+            result = pd.read_sql(query, conn, params=(customer_id,))
         
         if result.empty:
             print(f"No customer found with ID: {customer_id}")
@@ -86,28 +238,43 @@ class DataHandler:
     def get_all_customer_ids(self):
         """Get list of all customer IDs for debugging"""
         query = "SELECT Customer_ID FROM customers"
-        result = pd.read_sql(query, self.conn)
+        with self.connection() as conn:
+            result = pd.read_sql(query, conn)
         return result['Customer_ID'].tolist()
     
     # ... rest of the methods remain the same ...
     
     def get_product_data(self, product_id):
         """Retrieve product data by ID"""
-        query = f"SELECT * FROM products WHERE product_id = '{product_id}'"
-        return pd.read_sql(query, self.conn).to_dict('records')[0]
+        return self.catalog.get(product_id)
+    
+    def get_customer_history(self, customer_id):
+        """Browsing and purchase history lists of a customer (None if unknown)"""
+        return self.history.get(customer_id)
+    
+    def update_customer_history(self, customer_id, browsing_history, purchase_history):
+        """Store a customer's history lists as JSON arrays; returns False if unknown"""
+        query = "UPDATE customers SET Browsing_History = ?, Purchase_History = ? WHERE Customer_ID = ?"
+        params = (json.dumps(list(browsing_history)), json.dumps(list(purchase_history)), customer_id)
+        with self.write_connection() as conn:
+            return conn.execute(query, params).rowcount > 0
     
     def get_similar_products(self, product_id):
-        """Get similar products for a given product"""
-        query = f"SELECT similar_products FROM products WHERE product_id = '{product_id}'"
-        result = pd.read_sql(query, self.conn)
-        if not result.empty:
-            return eval(result.iloc[0]['similar_products'])
-        return []
+        """Get similar products for a given product (IDs, most similar first)"""
+        catalog = self.catalog
+        return catalog.product_ids[catalog.similar_rows(product_id)].tolist()
+    
+    def explain(self):
+        """Query plans of the hot queries, to confirm they use the indexes"""
+        with self.connection() as conn:
+            return explain(conn)
     
     def close(self):
         """Close database connection"""
-        if self.conn:
-            self.conn.close()
+        if self.pool is not None:
+            self.pool.close()
+        elif self._conn:
+            self._conn.close()
 
 # Example usage
 if __name__ == "__main__":
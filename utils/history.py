@@ -0,0 +1,154 @@
+# utils/history.py
+import ast
+import copy
+import hashlib
+import json
+import sqlite3
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+HISTORY_COLUMNS = ('Browsing_History', 'Purchase_History')
+
+@lru_cache(maxsize=65536)
+def parse_list(value) -> Tuple[str, ...]:
+    """Items of a stored list cell, JSON or legacy "['a', 'b']" form (bad or missing -> ())"""
+    if not isinstance(value, str):
+        return ()
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        try:
+            parsed = ast.literal_eval(value)
+        except (ValueError, SyntaxError, TypeError):
+            return ()
+    if not isinstance(parsed, (list, tuple)):
+        return ()
+    return tuple(item for item in parsed if isinstance(item, str))
+
+class Vocabulary:
+    """Interned strings: each distinct label is stored once and referred to by code"""
+
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+        self.labels: List[str] = []
+
+    def intern(self, label: str) -> int:
+        code = self.index.get(label)
+        if code is None:
+            code = self.index[label] = len(self.labels)
+            self.labels.append(label)
+        return code
+
+    def decode(self, codes: np.ndarray) -> List[str]:
+        labels = self.labels
+        return [labels[code] for code in codes.tolist()]
+
+class InternedLists:
+    """Many short string lists as CSR arrays: row i is codes[offsets[i]:offsets[i + 1]]"""
+
+    def __init__(self, offsets: np.ndarray, codes: np.ndarray, vocabulary: Vocabulary):
+        self.offsets = offsets
+        self.codes = codes
+        self.vocabulary = vocabulary
+
+    @classmethod
+    def from_cells(cls, cells: Iterable, vocabulary: Vocabulary) -> 'InternedLists':
+        """Parse every cell once (see parse_list) and intern its items"""
+        offsets = [0]
+        codes = []
+        for cell in cells:
+            codes.extend(vocabulary.intern(item) for item in parse_list(cell))
+            offsets.append(len(codes))
+        return cls(np.asarray(offsets, dtype=np.int64), np.asarray(codes, dtype=np.int32), vocabulary)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def codes_at(self, row: int) -> np.ndarray:
+        return self.codes[self.offsets[row]:self.offsets[row + 1]]
+
+    def get(self, row: int) -> List[str]:
+        return self.vocabulary.decode(self.codes_at(row))
+
+class HistoryIndex:
+    """Every customer's browsing and purchase history, parsed once at load
+
+    Both columns share one vocabulary of category / subcategory labels, so
+    the request path reads lists back from integer arrays instead of
+    evaluating the stored strings. Customers changed after the load (see
+    updated()) live in a small overlay of rows; `lists` keeps the histories
+    as loaded.
+    """
+
+    def __init__(self, customer_ids: Iterable[str], columns: Dict[str, Iterable], version=None):
+        self.version = version
+        self.vocabulary = Vocabulary()
+        self.rows = {customer_id: row for row, customer_id in enumerate(customer_ids)}
+        self.lists = {
+            name: InternedLists.from_cells(cells, self.vocabulary)
+            for name, cells in columns.items()
+        }
+        self.overrides: Dict[int, Dict[str, List[str]]] = {}
+        self._next_row = len(self.rows)
+
+    @classmethod
+    def from_frame(cls, customers: pd.DataFrame, version=None) -> 'HistoryIndex':
+        return cls(customers['Customer_ID'],
+                   {name: customers[name] for name in HISTORY_COLUMNS}, version)
+
+    @classmethod
+    def load(cls, conn: sqlite3.Connection, version=None) -> 'HistoryIndex':
+        customers = pd.read_sql(
+            f"SELECT Customer_ID, {', '.join(HISTORY_COLUMNS)} FROM customers", conn
+        )
+        return cls.from_frame(customers, version)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def updated(self, changed: Dict[str, Optional[Dict]], version=None) -> 'HistoryIndex':
+        """Copy with some customers' stored cells replaced (None drops the customer)
+
+        The parsed arrays are shared with this index, which is left as it
+        was, so requests holding it keep a consistent view.
+        """
+        index = copy.copy(self)
+        index.version = version
+        index.rows = dict(self.rows)
+        index.overrides = dict(self.overrides)
+        for customer_id, cells in changed.items():
+            if cells is None:
+                row = index.rows.pop(customer_id, None)
+                index.overrides.pop(row, None)
+                continue
+            row = index.rows.get(customer_id)
+            if row is None:
+                row = index.rows[customer_id] = index._next_row
+                index._next_row += 1
+            index.overrides[row] = {name: list(parse_list(cells.get(name))) for name in self.lists}
+        return index
+
+    def fingerprint(self) -> str:
+        """Content hash of the parsed histories, for caches derived from them"""
+        digest = hashlib.sha1(json.dumps(self.vocabulary.labels).encode('utf-8'))
+        for name, lists in self.lists.items():
+            digest.update(name.encode('utf-8'))
+            digest.update(lists.offsets.tobytes())
+            digest.update(lists.codes.tobytes())
+        if self.overrides or len(self.rows) != self._next_row:
+            digest.update(json.dumps([sorted(self.rows.items()), sorted(self.overrides.items())]).encode('utf-8'))
+        return digest.hexdigest()
+
+    def at(self, row: int) -> Dict[str, List[str]]:
+        """Histories of the customer at a row position"""
+        override = self.overrides.get(row)
+        if override is not None:
+            return {name: list(items) for name, items in override.items()}
+        return {name: lists.get(row) for name, lists in self.lists.items()}
+
+    def get(self, customer_id: str) -> Optional[Dict[str, List[str]]]:
+        """Histories of a customer, or None if unknown"""
+        row = self.rows.get(customer_id)
+        return None if row is None else self.at(row)
@@ -0,0 +1,127 @@
+# utils/job_queue.py
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, Optional
+
+FINISHED_STATES = ('success', 'error')
+
+@dataclass
+class Job:
+    job_id: str
+    customer_id: str
+    status: str = 'queued'
+    progress: float = 0.0
+    message: str = 'Waiting for a worker...'
+    result: Optional[Dict] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    version: int = 0  # bumped on every change so watchers can tell updates apart
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def to_dict(self) -> Dict:
+        data = {
+            'job_id': self.job_id,
+            'customer_id': self.customer_id,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message
+        }
+        if self.result is not None:
+            data.update(self.result)
+        if self.error is not None:
+            data['message'] = self.error
+        return data
+
+class JobManager:
+    """Run recommendation work on a background pool and track it as jobs
+
+    Submitting a customer that already has a queued or running job returns
+    that job, so identical in-flight requests share one computation.
+    worker(customer_id, report) must return a dict merged into the job's
+    payload (or None for "nothing found"); report(progress, message) updates
+    the job while it runs.
+    """
+
+    def __init__(self, worker: Callable, max_workers: int = 4, retention_seconds: float = 600):
+        self.worker = worker
+        self.retention_seconds = retention_seconds
+        self.jobs: Dict[str, Job] = {}
+        self._inflight: Dict[str, Job] = {}
+        self._changed = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='recs-job')
+
+    def _update(self, job: Job, **changes):
+        with self._changed:
+            for name, value in changes.items():
+                setattr(job, name, value)
+            job.version += 1
+            if job.finished:
+                job.finished_at = time.time()
+                self._inflight.pop(job.customer_id, None)
+            self._changed.notify_all()
+
+    def _prune(self):
+        cutoff = time.time() - self.retention_seconds
+        for job_id in [job_id for job_id, job in self.jobs.items()
+                       if job.finished and job.finished_at < cutoff]:
+            del self.jobs[job_id]
+
+    def submit(self, customer_id: str) -> Job:
+        """Enqueue work for a customer, coalescing onto an in-flight job"""
+        with self._changed:
+            self._prune()
+            job = self._inflight.get(customer_id)
+            if job is not None:
+                return job
+            job = Job(job_id=uuid.uuid4().hex, customer_id=customer_id)
+            self.jobs[job.job_id] = job
+            self._inflight[customer_id] = job
+        self._executor.submit(self._run, job)
+        return job
+
+    def _run(self, job: Job):
+        self._update(job, status='running', progress=0.1, message='Generating recommendations...')
+        try:
+            result = self.worker(job.customer_id,
+                                 lambda progress, message: self._update(job, progress=progress, message=message))
+        except Exception as e:
+            self._update(job, status='error', progress=1.0, error=str(e))
+            return
+        if result:
+            self._update(job, status='success', progress=1.0, message='Done', result=result)
+        else:
+            self._update(job, status='error', progress=1.0, error='No recommendations found')
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def watch(self, job_id: str, keepalive: float = 15.0) -> Iterator[Optional[Dict]]:
+        """Yield the job's state on every change until it finishes (None = keep-alive)"""
+        seen = -1
+        while True:
+            with self._changed:
+                job = self.jobs.get(job_id)
+                if job is None:
+                    return
+                if job.version == seen:
+                    self._changed.wait(keepalive)
+                    if job.version == seen:
+                        snapshot = None
+                    else:
+                        seen, snapshot = job.version, job.to_dict()
+                else:
+                    seen, snapshot = job.version, job.to_dict()
+                finished = job.finished and snapshot is not None
+            yield snapshot
+            if finished:
+                return
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
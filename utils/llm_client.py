@@ -0,0 +1,208 @@
+# utils/llm_client.py
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Dict, Iterable, Iterator, List, Optional
+import ollama
+from utils.response_cache import ResponseCache
+
+DEFAULT_MODEL = os.environ.get('LLM_MODEL', 'gemma:2b')
+
+class LLMError(RuntimeError):
+    """An LLM call failed after all retries or did not finish in time"""
+
+class LLMClient:
+    """Shared client every agent uses to talk to the model
+
+    Calls run on a bounded thread pool (max_concurrency requests in flight),
+    each with a timeout and retry with exponential backoff. Identical
+    requests (same model, prompt, format and options) that are already in
+    flight share one call. host defaults to OLLAMA_HOST, so the client can be
+    pointed at llm_stub_server.py for throughput tests without a model.
+    Requests made with cached=True are answered from response_cache when
+    the identical request has been answered before. Streams run on the
+    caller's thread but hold one of max_concurrency stream slots while the
+    model is producing output.
+    """
+
+    def __init__(self, model: str = DEFAULT_MODEL, host: Optional[str] = None,
+                 max_concurrency: int = 4, timeout: float = 120.0,
+                 retries: int = 2, backoff: float = 0.5,
+                 response_cache: Optional[ResponseCache] = None):
+        self.model = model
+        self.response_cache = response_cache
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._client = ollama.Client(host=host or os.environ.get('OLLAMA_HOST'), timeout=timeout)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='llm')
+        self._stream_slots = threading.BoundedSemaphore(max_concurrency)
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'cached': 0, 'coalesced': 0, 'retries': 0, 'failures': 0}
+
+    @staticmethod
+    def request_key(model: str, prompt: str, format: Optional[str] = None,
+                    options: Optional[Dict] = None) -> str:
+        return json.dumps([model, prompt, format, options or {}], sort_keys=True)
+
+    def _should_retry(self, error: Exception) -> bool:
+        # Client errors (unknown model, bad request) will not fix themselves
+        status = getattr(error, 'status_code', None)
+        return not (isinstance(error, ollama.ResponseError) and status is not None and 0 <= status < 500)
+
+    def _call(self, model: str, prompt: str, format: Optional[str], options: Optional[Dict],
+              cache_key: Optional[str] = None) -> str:
+        for attempt in range(self.retries + 1):
+            try:
+                response = self._client.chat(
+                    model=model,
+                    messages=[{'role': 'user', 'content': prompt}],
+                    format=format,
+                    options=options
+                )
+                content = response['message']['content']
+                break
+            except Exception as e:
+                if attempt == self.retries or not self._should_retry(e):
+                    self._count('failures')
+                    raise LLMError(f"LLM call failed: {e}") from e
+                self._count('retries')
+                time.sleep(self.backoff * (2 ** attempt))
+
+        self._store(cache_key, model, content)
+        return content
+
+    def _count(self, *names: str):
+        with self._lock:
+            for name in names:
+                self.stats[name] += 1
+
+    def _store(self, cache_key: Optional[str], model: str, content: str):
+        # The answer is already paid for; failing to cache it must not fail the call
+        if cache_key is None:
+            return
+        try:
+            self.response_cache.put(cache_key, model, content)
+        except Exception as e:
+            print(f"Warning: could not cache LLM response: {e}")
+
+    def submit(self, prompt: str, format: Optional[str] = None, options: Optional[Dict] = None,
+               model: Optional[str] = None, cached: bool = False) -> Future:
+        """Start a chat completion in the background and return its Future (content string)"""
+        model = model or self.model
+        key = self.request_key(model, prompt, format, options)
+        cache_key = None
+        if cached and self.response_cache is not None:
+            cache_key = self.response_cache.key_for(key)
+            content = self.response_cache.get(cache_key)
+            if content is not None:
+                with self._lock:
+                    self.stats['requests'] += 1
+                    self.stats['cached'] += 1
+                future = Future()
+                future.set_result(content)
+                return future
+        with self._lock:
+            self.stats['requests'] += 1
+            future = self._inflight.get(key)
+            if future is not None:
+                self.stats['coalesced'] += 1
+                return future
+            future = self._executor.submit(self._call, model, prompt, format, options, cache_key)
+            self._inflight[key] = future
+        future.add_done_callback(lambda _: self._forget(key, future))
+        return future
+
+    def _forget(self, key: str, future: Future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def chat(self, prompt: str, format: Optional[str] = None, options: Optional[Dict] = None,
+             model: Optional[str] = None, timeout: Optional[float] = None, cached: bool = False) -> str:
+        """Blocking chat completion returning the message content"""
+        future = self.submit(prompt, format=format, options=options, model=model, cached=cached)
+        try:
+            return future.result(timeout=timeout or self.timeout)
+        except FutureTimeout as e:
+            raise LLMError("LLM call timed out") from e
+
+    def stream(self, prompt: str, format: Optional[str] = None, options: Optional[Dict] = None,
+               model: Optional[str] = None, cached: bool = False) -> Iterator[str]:
+        """Yield the response in chunks as the model produces them
+
+        Runs on the caller's thread (the consumer paces the stream) and is not
+        retried once output has started. A cached response is yielded whole;
+        a completed stream is stored for next time.
+        """
+        model = model or self.model
+        cache_key = None
+        if cached and self.response_cache is not None:
+            cache_key = self.response_cache.key_for(self.request_key(model, prompt, format, options))
+            content = self.response_cache.get(cache_key)
+            if content is not None:
+                self._count('requests', 'cached')
+                yield content
+                return
+
+        self._count('requests')
+        if not self._stream_slots.acquire(timeout=self.timeout):
+            self._count('failures')
+            raise LLMError(f"No stream slot free after {self.timeout}s")
+        parts = []
+        try:
+            for chunk in self._client.chat(
+                model=model,
+                messages=[{'role': 'user', 'content': prompt}],
+                format=format,
+                options=options,
+                stream=True
+            ):
+                text = chunk['message']['content']
+                if text:
+                    parts.append(text)
+                    yield text
+        except Exception as e:
+            self._count('failures')
+            raise LLMError(f"LLM stream failed: {e}") from e
+        finally:
+            # Also released when the consumer stops reading early
+            self._stream_slots.release()
+        self._store(cache_key, model, ''.join(parts))
+
+    def map(self, prompts: Iterable[str], format: Optional[str] = None, options: Optional[Dict] = None,
+            deadline: Optional[float] = None, cached: bool = False) -> List[Optional[str]]:
+        """Run prompts concurrently; results missing at the deadline (seconds) or failed are None"""
+        futures = [self.submit(prompt, format=format, options=options, cached=cached) for prompt in prompts]
+        end = time.monotonic() + (deadline if deadline is not None else self.timeout)
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result(timeout=max(0.0, end - time.monotonic())))
+            except (FutureTimeout, LLMError):
+                results.append(None)
+        return results
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self.response_cache is not None:
+            self.response_cache.close()
+
+_default_client: Optional[LLMClient] = None
+_default_lock = threading.Lock()
+
+def get_llm_client() -> LLMClient:
+    """Process-wide LLM client shared by all agents"""
+    global _default_client
+    if _default_client is None:
+        with _default_lock:
+            if _default_client is None:
+                _default_client = LLMClient(
+                    max_concurrency=int(os.environ.get('LLM_MAX_CONCURRENCY', 4)),
+                    timeout=float(os.environ.get('LLM_TIMEOUT', 120)),
+                    response_cache=ResponseCache(os.environ.get('LLM_CACHE_PATH', 'cache/llm_responses.db'))
+                )
+    return _default_client
@@ -0,0 +1,259 @@
+# utils/lookalike.py
+import json
+import numbers
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from utils.history import HistoryIndex, parse_list
+
+# One-hot encoded customer columns
+CATEGORICAL_FEATURES = ('Gender', 'Location', 'Customer_Segment', 'Season')
+
+# Standardized numeric columns (Avg_Order_Value on a log scale)
+NUMERIC_FEATURES = ('Age', 'Avg_Order_Value')
+
+# Weight of the bag-of-categories block relative to each demographic feature
+HISTORY_WEIGHT = 2.0
+
+# LSH tables; each has 2 ** bits buckets, bits chosen for about BUCKET_SIZE donors per bucket
+LSH_TABLES = 16
+BUCKET_SIZE = 32
+MIN_LSH_BITS = 4
+MAX_LSH_BITS = 16
+
+# Rows taken from any one bucket; identical profiles can fill a bucket at scale
+MAX_BUCKET_ROWS = 256
+
+# Lookalikes whose histories a cold-start customer borrows
+LOOKALIKE_NEIGHBOURS = 10
+
+class CustomerEncoder:
+    """Fixed-length numeric vectors of customers
+
+    Demographics are one-hot (categorical) or z-scored (numeric), each
+    contributing about 1 to the squared norm; browsing and purchase items
+    form a unit-norm bag scaled by HISTORY_WEIGHT. Vectors are L2-normalized
+    so a dot product is cosine similarity.
+    """
+
+    def __init__(self, levels: Dict[str, List[str]], stats: Dict[str, Tuple[float, float]],
+                 items: List[str]):
+        self.levels = levels
+        self.stats = stats
+        self.items = items
+        self.item_index = {item: code for code, item in enumerate(items)}
+        self.offsets = {}
+        start = len(NUMERIC_FEATURES)
+        for name in CATEGORICAL_FEATURES:
+            self.offsets[name] = start
+            start += len(levels[name])
+        self.history_offset = start
+        self.dimensions = start + len(items)
+
+    @classmethod
+    def fit(cls, customers: pd.DataFrame, history: HistoryIndex) -> 'CustomerEncoder':
+        levels = {
+            name: sorted(customers[name].dropna().astype(str).unique().tolist())
+            for name in CATEGORICAL_FEATURES
+        }
+        stats = {}
+        for name in NUMERIC_FEATURES:
+            values = cls._numeric(name, customers[name].to_numpy(dtype=np.float64))
+            std = float(np.nanstd(values))
+            stats[name] = (float(np.nanmean(values)), std if std > 0 else 1.0)
+        return cls(levels, stats, list(history.vocabulary.labels))
+
+    @staticmethod
+    def _numeric(name: str, values: np.ndarray) -> np.ndarray:
+        return np.log1p(np.maximum(values, 0)) if name == 'Avg_Order_Value' else values
+
+    def encode_frame(self, customers: pd.DataFrame, history: HistoryIndex) -> np.ndarray:
+        """Vectors of every customer in a frame, rows aligned with history"""
+        vectors = np.zeros((len(customers), self.dimensions), dtype=np.float32)
+        for col, name in enumerate(NUMERIC_FEATURES):
+            mean, std = self.stats[name]
+            values = self._numeric(name, customers[name].to_numpy(dtype=np.float64))
+            vectors[:, col] = np.nan_to_num((values - mean) / std)
+        for name in CATEGORICAL_FEATURES:
+            codes = pd.Categorical(customers[name].astype(str), categories=self.levels[name]).codes
+            known = np.flatnonzero(codes >= 0)
+            vectors[known, self.offsets[name] + codes[known]] = 1.0
+
+        # Bag of history items; vocabulary codes line up with self.items at fit time
+        for lists in history.lists.values():
+            rows = np.repeat(np.arange(len(lists)), np.diff(lists.offsets))
+            known = lists.codes < len(self.items)
+            vectors[rows[known], self.history_offset + lists.codes[known]] = 1.0
+        self._scale_history(vectors)
+        return self._normalize(vectors)
+
+    def encode(self, record: Dict) -> np.ndarray:
+        """Vector of one customer record (missing fields contribute nothing)"""
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for col, name in enumerate(NUMERIC_FEATURES):
+            value = record.get(name)
+            # numbers.Real also covers NumPy scalars (e.g. int64 ages from pandas rows)
+            if isinstance(value, numbers.Real) and not np.isnan(value):
+                mean, std = self.stats[name]
+                vector[col] = (self._numeric(name, np.float64(value)) - mean) / std
+        for name in CATEGORICAL_FEATURES:
+            value = record.get(name)
+            if value in self.levels[name]:
+                vector[self.offsets[name] + self.levels[name].index(value)] = 1.0
+        for name in ('Browsing_History', 'Purchase_History'):
+            value = record.get(name, ())
+            for item in (parse_list(value) if isinstance(value, str) else value):
+                code = self.item_index.get(item)
+                if code is not None:
+                    vector[self.history_offset + code] = 1.0
+        vectors = vector[None, :]
+        self._scale_history(vectors)
+        return self._normalize(vectors)[0]
+
+    def _scale_history(self, vectors: np.ndarray):
+        bag = vectors[:, self.history_offset:]
+        norms = np.sqrt(bag.sum(axis=1, keepdims=True))
+        np.divide(bag * HISTORY_WEIGHT, norms, out=bag, where=norms > 0)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+    def to_json(self) -> Dict:
+        return {'levels': self.levels, 'stats': self.stats, 'items': self.items}
+
+    @classmethod
+    def from_json(cls, meta: Dict) -> 'CustomerEncoder':
+        return cls(meta['levels'], {name: tuple(v) for name, v in meta['stats'].items()}, meta['items'])
+
+class LookalikeIndex:
+    """Approximate nearest customers by random-projection LSH
+
+    Only donor customers (those whose preferences can be derived) are
+    indexed. Each of LSH_TABLES tables hashes a vector to the sign pattern
+    of its random projections, with enough bits for buckets of about
+    BUCKET_SIZE donors. Buckets of all tables share one sorted key array
+    (table number in the high bits) with CSR offsets into their members,
+    so a query is one searchsorted for every table. Candidates from the
+    query's buckets (and their one-bit neighbours when that is too few)
+    are ranked by exact cosine similarity.
+    """
+
+    ARRAYS = ('vectors', 'donors', 'planes', 'bucket_keys', 'bucket_offsets', 'bucket_rows')
+
+    def __init__(self, encoder: CustomerEncoder, customer_ids: List[str], vectors: np.ndarray,
+                 donors: np.ndarray, planes: np.ndarray, bucket_keys: np.ndarray,
+                 bucket_offsets: np.ndarray, bucket_rows: np.ndarray):
+        self.encoder = encoder
+        self.customer_ids = customer_ids
+        self.rows = {customer_id: row for row, customer_id in enumerate(customer_ids)}
+        self.vectors = vectors
+        self.donors = donors
+        self.planes = planes
+        self.bucket_keys = bucket_keys
+        self.bucket_offsets = bucket_offsets
+        self.bucket_rows = bucket_rows
+        tables, _, bits = planes.shape
+        self.powers = 1 << np.arange(bits, dtype=np.int64)
+        self.table_keys = np.arange(tables, dtype=np.int64) << bits
+
+    @staticmethod
+    def bits_for(donors: int) -> int:
+        """Bits per table giving buckets of about BUCKET_SIZE donors"""
+        return int(np.clip(np.log2(max(donors, 1) / BUCKET_SIZE), MIN_LSH_BITS, MAX_LSH_BITS))
+
+    @classmethod
+    def build(cls, customers: pd.DataFrame, history: HistoryIndex, donors: np.ndarray,
+              tables: int = LSH_TABLES, bits: Optional[int] = None, seed: int = 0) -> 'LookalikeIndex':
+        """Index the donor rows of a customers frame (rows aligned with history)"""
+        encoder = CustomerEncoder.fit(customers, history)
+        vectors = encoder.encode_frame(customers, history)
+        donors = np.asarray(donors, dtype=np.int64)
+        bits = cls.bits_for(len(donors)) if bits is None else bits
+        planes = np.random.default_rng(seed).standard_normal(
+            (tables, encoder.dimensions, bits)).astype(np.float32)
+
+        # (table << bits) | hash for every table x donor, members sorted by it
+        powers = 1 << np.arange(bits, dtype=np.int64)
+        keys = np.concatenate([
+            (table << bits) | (((vectors[donors] @ planes[table]) > 0) @ powers)
+            for table in range(tables)
+        ])
+        order = np.argsort(keys, kind='stable')
+        bucket_keys, starts = np.unique(keys[order], return_index=True)
+        bucket_rows = np.tile(donors, tables)[order].astype(np.int32)
+        return cls(encoder, list(customers['Customer_ID']), vectors, donors, planes,
+                   bucket_keys, np.append(starts, len(order)), bucket_rows)
+
+    def vector_of(self, record: Dict) -> np.ndarray:
+        """Indexed vector of a known customer, else the record encoded on the fly"""
+        row = self.rows.get(record.get('Customer_ID'))
+        return self.vectors[row] if row is not None else self.encoder.encode(record)
+
+    def _gather(self, keys: np.ndarray) -> np.ndarray:
+        """Members of the buckets with these keys (at most MAX_BUCKET_ROWS each)"""
+        positions = np.searchsorted(self.bucket_keys, keys)
+        hit = positions < len(self.bucket_keys)
+        hit[hit] = self.bucket_keys[positions[hit]] == keys[hit]
+        positions = positions[hit]
+        starts = self.bucket_offsets[positions]
+        lengths = np.minimum(self.bucket_offsets[positions + 1] - starts, MAX_BUCKET_ROWS)
+        # Concatenated [start, start + length) ranges without a Python loop
+        shifts = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return self.bucket_rows[shifts + np.arange(len(shifts))]
+
+    def _candidates(self, vector: np.ndarray, wanted: int) -> np.ndarray:
+        signs = np.einsum('d,tdb->tb', vector, self.planes) > 0
+        keys = self.table_keys | (signs @ self.powers)
+        candidates = self._gather(keys)
+        if len(candidates) < wanted:
+            # Multi-probe: buckets one bit flip away
+            candidates = np.concatenate([candidates, self._gather((keys[:, None] ^ self.powers).ravel())])
+        if not len(candidates):
+            return candidates
+        candidates = np.sort(candidates)
+        return candidates[np.append(True, candidates[1:] != candidates[:-1])]
+
+    def query(self, record: Dict, k: int = LOOKALIKE_NEIGHBOURS) -> Tuple[np.ndarray, np.ndarray]:
+        """Row positions and cosine similarities of a customer's k nearest donors, best first"""
+        vector = self.vector_of(record)
+        candidates = self._candidates(vector, k)
+        candidates = candidates[candidates != self.rows.get(record.get('Customer_ID'), -1)]
+        similarities = self.vectors[candidates] @ vector
+        if len(candidates) > k:
+            # Everything tied with the k-th best, then an exact order (ties by row)
+            top = np.argpartition(-similarities, k - 1)[:k]
+            keep = similarities >= similarities[top].min()
+            candidates, similarities = candidates[keep], similarities[keep]
+        order = np.lexsort((candidates, -similarities))[:k]
+        return candidates[order], similarities[order]
+
+    def borrow(self, record: Dict, k: int = LOOKALIKE_NEIGHBOURS) -> List[str]:
+        """History items of a customer's lookalikes, most shared (similarity-weighted) first"""
+        rows, similarities = self.query(record, k)
+        if not len(rows):
+            return []
+        offset = self.encoder.history_offset
+        weights = similarities @ (self.vectors[rows, offset:] > 0)
+        order = np.lexsort((np.arange(len(weights)), -weights))
+        return [self.encoder.items[code] for code in order.tolist() if weights[code] > 0]
+
+    def save(self, directory):
+        directory = Path(directory)
+        for name in self.ARRAYS:
+            np.save(directory / f'lookalike_{name}.npy', getattr(self, name))
+        with open(directory / 'lookalike.json', 'w') as f:
+            json.dump({'encoder': self.encoder.to_json(), 'customer_ids': self.customer_ids}, f)
+
+    @classmethod
+    def load(cls, directory) -> Optional['LookalikeIndex']:
+        """Index saved by save(), memory-mapped (None if there is none)"""
+        directory = Path(directory)
+        if not (directory / 'lookalike.json').exists():
+            return None
+        with open(directory / 'lookalike.json') as f:
+            meta = json.load(f)
+        arrays = {name: np.load(directory / f'lookalike_{name}.npy', mmap_mode='r') for name in cls.ARRAYS}
+        return cls(CustomerEncoder.from_json(meta['encoder']), meta['customer_ids'], **arrays)
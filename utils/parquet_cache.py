@@ -0,0 +1,134 @@
+# utils/parquet_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+import pandas as pd
+
+MANIFEST_NAME = 'manifest.json'
+
+# Every column of every row, in a stable order, hashed into the content fingerprint
+FINGERPRINT_QUERY = "SELECT rowid, * FROM products ORDER BY rowid"
+
+# Rows hashed per fetch while fingerprinting
+FINGERPRINT_BATCH = 10000
+
+class ProductCache:
+    """Per-category Parquet shards of the products table (cache/products_<Category>.parquet)
+
+    A manifest records the source database's mtime, row count and a hash of
+    every column of the table. Loading rebuilds the shards from SQLite when they are stale,
+    otherwise it is a column read of just the requested categories.
+    """
+
+    def __init__(self, db_name: str = 'ecommerce.db', cache_dir='cache'):
+        self.db_name = db_name
+        self.cache_dir = Path(cache_dir)
+        self.manifest_path = self.cache_dir / MANIFEST_NAME
+
+    def _shard_path(self, category: str) -> Path:
+        return self.cache_dir / f"products_{category}.parquet"
+
+    def _read_manifest(self) -> Optional[Dict]:
+        if not self.manifest_path.exists():
+            return None
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest: Dict):
+        tmp_path = self.manifest_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _fingerprint(self, conn: sqlite3.Connection) -> str:
+        """Hash of the whole products table, so any edit to any column changes it"""
+        digest = hashlib.blake2b(digest_size=16)
+        cursor = conn.execute(FINGERPRINT_QUERY)
+        digest.update(repr([column[0] for column in cursor.description]).encode())
+        while True:
+            rows = cursor.fetchmany(FINGERPRINT_BATCH)
+            if not rows:
+                break
+            digest.update(repr(rows).encode())
+        return digest.hexdigest()
+
+    def _source_mtime(self) -> Optional[float]:
+        return os.path.getmtime(self.db_name) if os.path.exists(self.db_name) else None
+
+    def is_stale(self, conn: sqlite3.Connection) -> bool:
+        """Whether the shards need rebuilding from the database"""
+        manifest = self._read_manifest()
+        if manifest is None or manifest.get('source_db') != os.path.abspath(self.db_name):
+            return True
+        if any(not (self.cache_dir / shard['file']).exists() for shard in manifest['shards'].values()):
+            return True
+        if manifest['source_mtime'] == self._source_mtime():
+            return False
+
+        # The file changed (possibly only other tables): compare contents, and
+        # rebuild unless the hash proves the products table is unchanged
+        if self._fingerprint(conn) != manifest.get('fingerprint'):
+            return True
+        manifest['source_mtime'] = self._source_mtime()
+        self._write_manifest(manifest)
+        return False
+
+    def build(self, conn: sqlite3.Connection) -> Dict:
+        """Rewrite every category shard and the manifest from the products table"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        source_mtime = self._source_mtime()
+        fingerprint = self._fingerprint(conn)
+        products = pd.read_sql("SELECT * FROM products", conn)
+        products = products.drop(columns=[c for c in products.columns if c.startswith('Unnamed')])
+
+        previous = self._read_manifest() or {'shards': {}}
+        shards = {}
+        for category, group in products.groupby('Category', sort=True):
+            path = self._shard_path(category)
+            tmp_path = path.with_suffix('.tmp')
+            group.reset_index(drop=True).to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+            shards[category] = {'file': path.name, 'rows': len(group)}
+
+        # Drop shards of categories that no longer exist
+        for category, shard in previous['shards'].items():
+            if category not in shards:
+                (self.cache_dir / shard['file']).unlink(missing_ok=True)
+
+        manifest = {
+            'source_db': os.path.abspath(self.db_name),
+            'source_mtime': source_mtime,
+            'row_count': len(products),
+            'fingerprint': fingerprint,
+            'columns': products.columns.tolist(),
+            'built_at': time.time(),
+            'shards': shards
+        }
+        self._write_manifest(manifest)
+        print(f"Rebuilt product cache: {len(products)} products in {len(shards)} shards")
+        return manifest
+
+    def ensure_fresh(self, conn: sqlite3.Connection) -> Dict:
+        """Rebuild stale shards and return the current manifest"""
+        if self.is_stale(conn):
+            return self.build(conn)
+        return self._read_manifest()
+
+    def load(self, conn: sqlite3.Connection, categories: Optional[Iterable[str]] = None,
+             columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Products of the given categories (all by default), rebuilding stale shards first"""
+        manifest = self.ensure_fresh(conn)
+        if categories is None:
+            categories = sorted(manifest['shards'])
+        frames = [
+            pd.read_parquet(self.cache_dir / manifest['shards'][cat]['file'], columns=columns)
+            for cat in dict.fromkeys(categories)
+            if cat in manifest['shards']
+        ]
+        if not frames:
+            return pd.DataFrame(columns=columns or manifest['columns'])
+        return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,46 @@
+# utils/preference_cache.py
+import hashlib
+import json
+from typing import Dict, Optional
+from utils.sqlite_cache import SQLiteCache
+
+class PreferenceCache(SQLiteCache):
+    """Two-tier (memory + SQLite) cache of LLM-derived customer preferences
+
+    Entries are keyed by customer ID and remember a hash of the profile fields
+    that fed the prompt, so a changed profile is a miss even before its TTL.
+    """
+
+    TABLE = 'preference_cache'
+    KEY_COLUMN = 'customer_id'
+    TAG_COLUMN = 'profile_hash'
+    VALUE_COLUMN = 'preferences'
+
+    def __init__(self, db_path='cache/preferences.db', ttl_seconds: float = 24 * 3600,
+                 max_memory_entries: int = 1024, max_disk_entries: int = 100000):
+        super().__init__(db_path, ttl_seconds, max_memory_entries, max_disk_entries)
+
+    @staticmethod
+    def profile_hash(profile) -> str:
+        """Hash the profile fields used by the preference prompt"""
+        fields = [
+            profile.age, profile.gender, profile.location,
+            list(profile.browsing_history), list(profile.purchase_history),
+            profile.customer_segment, profile.avg_order_value, profile.season
+        ]
+        payload = json.dumps(fields, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def encode(self, value: Dict) -> str:
+        return json.dumps(value)
+
+    def decode(self, stored: str) -> Dict:
+        return json.loads(stored)
+
+    def get(self, customer_id: str, profile_hash: str) -> Optional[Dict]:
+        """Return cached preferences, or None if missing, stale or for an older profile"""
+        return self.lookup(customer_id, profile_hash)
+
+    def put(self, customer_id: str, profile_hash: str, preferences: Dict):
+        """Store preferences in both tiers, evicting least recently used rows"""
+        self.store(customer_id, profile_hash, preferences)
@@ -0,0 +1,230 @@
+# utils/recommendation_store.py
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+from utils.catalog import database_version
+
+RECOMMENDATIONS_TABLE = 'customer_recommendations'
+STAGING_TABLE = 'customer_recommendations_staging'
+
+# Clustered on (customer_id, rank), so one customer's list is a single range scan
+TABLE_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        customer_id TEXT NOT NULL,
+        rank INTEGER NOT NULL,
+        product_id TEXT NOT NULL,
+        score REAL,
+        generated_at REAL,
+        run_id TEXT,
+        PRIMARY KEY (customer_id, rank)
+    ) WITHOUT ROWID
+'''
+
+class RecommendationStore:
+    """Precomputed recommendations in a normalized customer_recommendations table
+
+    A run fills a staging table and swaps it in with one transaction, so
+    readers always see either the previous run or the complete new one.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.run_id = None
+        self.generated_at = None
+
+    def ensure_schema(self):
+        """Create the live table so readers work before the first run"""
+        with self.conn:
+            self.conn.execute(TABLE_SCHEMA.format(table=RECOMMENDATIONS_TABLE))
+
+    def begin_run(self) -> str:
+        """Start a run with an empty staging table and return its run ID"""
+        self.ensure_schema()
+        self.run_id = uuid.uuid4().hex
+        self.generated_at = time.time()
+        with self.conn:
+            self.conn.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+            self.conn.execute(TABLE_SCHEMA.format(table=STAGING_TABLE))
+        return self.run_id
+
+    @property
+    def insert_sql(self) -> str:
+        return f"INSERT INTO {STAGING_TABLE} VALUES (?, ?, ?, ?, ?, ?)"
+
+    def rows_for(self, customer_id: str, scored: Sequence[Tuple[str, float]]) -> List[Tuple]:
+        """Staging rows (rank 1..n) for one customer's (product_id, score) list"""
+        return [
+            (customer_id, rank, product_id, float(score), self.generated_at, self.run_id)
+            for rank, (product_id, score) in enumerate(scored, 1)
+        ]
+
+    def begin_incremental(self) -> str:
+        """Start a run that rewrites some customers in the live table (see replace)"""
+        self.ensure_schema()
+        self.run_id = uuid.uuid4().hex
+        self.generated_at = time.time()
+        return self.run_id
+
+    def replace(self, results: Dict[str, Optional[Sequence[Tuple[str, float]]]]):
+        """Swap in new lists for some customers in one transaction (None or [] removes a list)"""
+        rows = [
+            row for customer_id, scored in results.items() if scored
+            for row in self.rows_for(customer_id, scored)
+        ]
+        with self.conn:
+            self.conn.executemany(
+                f"DELETE FROM {RECOMMENDATIONS_TABLE} WHERE customer_id = ?",
+                [(customer_id,) for customer_id in results]
+            )
+            self.conn.executemany(f"INSERT INTO {RECOMMENDATIONS_TABLE} VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def commit_run(self):
+        """Atomically replace the live table with the staging table"""
+        self.conn.commit()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.execute(f"DROP TABLE IF EXISTS {RECOMMENDATIONS_TABLE}")
+            self.conn.execute(f"ALTER TABLE {STAGING_TABLE} RENAME TO {RECOMMENDATIONS_TABLE}")
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    def get(self, customer_id: str) -> List[Dict]:
+        """Ranked recommendations for a customer from the live table"""
+        cursor = self.conn.execute(f'''
+            SELECT rank, product_id, score, generated_at, run_id
+            FROM {RECOMMENDATIONS_TABLE}
+            WHERE customer_id = ?
+            ORDER BY rank
+        ''', (customer_id,))
+        columns = [col[0] for col in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+class PrecomputedIndex:
+    """Memory-resident index of precomputed recommendations keyed by customer ID
+
+    Loaded from customer_recommendations (or recommendations.json when no
+    run has been stored yet) and hydrated with product details in one query.
+    Reloaded when the database holds a newer run than the one loaded.
+    Entries older than max_age_seconds are treated as misses.
+    """
+
+    def __init__(self, max_age_seconds: float = 24 * 3600, json_path='recommendations.json'):
+        self.max_age_seconds = max_age_seconds
+        self.json_path = Path(json_path)
+        self.entries: Dict[str, Tuple[float, List[Dict]]] = {}
+        self.loaded = False
+        # Database file stamp at the last check, and the stored run the entries came from
+        self.version = None
+        self.source = None
+        self.stats = {'hits': 0, 'misses': 0, 'stale': 0, 'reloads': 0}
+        self._lock = threading.RLock()
+
+    def _has_table(self, conn: sqlite3.Connection) -> bool:
+        row = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+            (RECOMMENDATIONS_TABLE,)
+        ).fetchone()
+        return row is not None
+
+    def _load_table(self, conn: sqlite3.Connection) -> Dict[str, Tuple[float, List[Dict]]]:
+        cursor = conn.execute(f'''
+            SELECT r.customer_id, r.generated_at, r.score, p.*
+            FROM {RECOMMENDATIONS_TABLE} r
+            JOIN products p ON p.Product_ID = r.product_id
+            ORDER BY r.customer_id, r.rank
+        ''')
+        columns = [col[0] for col in cursor.description]
+        entries = {}
+        for row in cursor:
+            customer_id, generated_at = row[0], row[1]
+            product = dict(zip(columns[3:], row[3:]))
+            product['score'] = row[2]
+            entries.setdefault(customer_id, (generated_at, []))[1].append(product)
+        return entries
+
+    def _load_json(self, conn: sqlite3.Connection) -> Dict[str, Tuple[float, List[Dict]]]:
+        if not self.json_path.exists():
+            return {}
+        with open(self.json_path) as f:
+            recommendations = json.load(f)
+        generated_at = self.json_path.stat().st_mtime
+
+        cursor = conn.execute("SELECT * FROM products")
+        columns = [col[0] for col in cursor.description]
+        products = {row[0]: dict(zip(columns, row)) for row in cursor}
+        return {
+            customer_id: (generated_at, [dict(products[pid]) for pid in product_ids if pid in products])
+            for customer_id, product_ids in recommendations.items()
+        }
+
+    def _source(self, conn: sqlite3.Connection) -> Tuple:
+        """Identity of what load() would read: the stored rows' count and newest run, or the JSON file"""
+        if self._has_table(conn):
+            count, generated_at = conn.execute(
+                f"SELECT COUNT(*), MAX(generated_at) FROM {RECOMMENDATIONS_TABLE}"
+            ).fetchone()
+            if count:
+                return ('table', count, generated_at)
+        return ('json', self.json_path.stat().st_mtime if self.json_path.exists() else None)
+
+    @staticmethod
+    def _database_version(conn: sqlite3.Connection) -> Optional[Tuple]:
+        path = conn.execute("PRAGMA database_list").fetchone()[2]
+        return database_version(path) if path else None
+
+    def load(self, conn: sqlite3.Connection):
+        """(Re)build the index from the latest stored run"""
+        version = self._database_version(conn)
+        source = self._source(conn)
+        entries = {}
+        if source[0] == 'table':
+            entries = self._load_table(conn)
+        if not entries:
+            entries = self._load_json(conn)
+        with self._lock:
+            self.entries = entries
+            self.version = version
+            self.source = source
+            self.loaded = True
+
+    def ensure_loaded(self, conn: sqlite3.Connection):
+        """Load the index on first use, and again once a newer run has been stored
+
+        The database file stamp is checked on every call; only when it moved
+        is the stored run compared, so unrelated writes cost one small query.
+        """
+        version = self._database_version(conn)
+        if self.loaded and version == self.version:
+            return
+        with self._lock:
+            if self.loaded and version == self.version:
+                return
+            if not self.loaded:
+                self.load(conn)
+            elif self._source(conn) != self.source:
+                self.load(conn)
+                self.stats['reloads'] += 1
+            else:
+                self.version = version
+
+    def get(self, customer_id: str, n: int = 5) -> Optional[List[Dict]]:
+        """Fresh precomputed recommendations, or None on a miss or stale entry"""
+        entry = self.entries.get(customer_id)
+        if entry is None:
+            self.stats['misses'] += 1
+            return None
+        generated_at, products = entry
+        if len(products) < n:
+            self.stats['misses'] += 1
+            return None
+        if time.time() - generated_at > self.max_age_seconds:
+            self.stats['stale'] += 1
+            return None
+        self.stats['hits'] += 1
+        return [dict(product) for product in products[:n]]
@@ -0,0 +1,34 @@
+# utils/response_cache.py
+import hashlib
+from typing import Optional
+from utils.sqlite_cache import SQLiteCache
+
+class ResponseCache(SQLiteCache):
+    """Two-tier (memory + SQLite) cache of LLM responses keyed by request content
+
+    The key is a SHA-256 of the request (model, prompt, format, options), so
+    the same prompt always maps to the same entry and any change in the
+    inputs is a different entry. Both tiers evict least recently used.
+    """
+
+    TABLE = 'llm_responses'
+    KEY_COLUMN = 'request_hash'
+    TAG_COLUMN = 'model'
+    VALUE_COLUMN = 'response'
+
+    def __init__(self, db_path='cache/llm_responses.db', max_memory_entries: int = 2048,
+                 max_disk_entries: int = 200000):
+        super().__init__(db_path, max_memory_entries=max_memory_entries,
+                         max_disk_entries=max_disk_entries)
+
+    @staticmethod
+    def key_for(request_key: str) -> str:
+        return hashlib.sha256(request_key.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached response for a request hash, or None"""
+        return self.lookup(key)
+
+    def put(self, key: str, model: str, response: str):
+        """Store a response in both tiers, evicting least recently used rows"""
+        self.store(key, model, response)
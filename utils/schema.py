@@ -0,0 +1,125 @@
+# utils/schema.py
+import sqlite3
+from typing import Dict, List, Tuple
+from utils.change_log import ensure_change_log
+
+# Tables loaded without keys (e.g. pandas to_sql) get them back from
+# apply_schema(), which the loaders run after every load
+PRIMARY_KEYS = {
+    'products': 'Product_ID',
+    'customers': 'Customer_ID'
+}
+
+# One category is searched in rating order on (Category, Product_Rating); several
+# are read in rating order off idx_products_rating, stopping at the LIMIT, instead
+# of being collected and sorted. The segment index covers the Customer_ID lookup.
+SECONDARY_INDEXES = [
+    ('idx_products_category_rating', 'products', ('Category', 'Product_Rating')),
+    ('idx_products_rating', 'products', ('Product_Rating',)),
+    ('idx_customers_segment_id', 'customers', ('Customer_Segment', 'Customer_ID'))
+]
+
+# Indexes earlier versions created that the ones above replace
+RETIRED_INDEXES = ('idx_products_category', 'idx_customers_segment')
+
+# Queries on the agents' request path, with representative parameters
+HOT_QUERIES: Dict[str, Tuple[str, Tuple]] = {
+    'customer_lookup': ("SELECT * FROM customers WHERE Customer_ID = ?", ('C1000',)),
+    'product_lookup': ("SELECT * FROM products WHERE Product_ID = ?", ('P2000',)),
+    'top_rated_in_categories': (
+        "SELECT * FROM products WHERE Category IN (?, ?, ?) ORDER BY Product_Rating DESC LIMIT 100",
+        ('Books', 'Fashion', 'Electronics')
+    ),
+    'segment_customers': ("SELECT Customer_ID FROM customers WHERE Customer_Segment = ?", ('Frequent Buyer',)),
+    'precomputed_recommendations': (
+        "SELECT product_id, score FROM customer_recommendations WHERE customer_id = ? ORDER BY rank",
+        ('C1000',)
+    )
+}
+
+def _table_exists(conn: sqlite3.Connection, table: str) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone() is not None
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+def ensure_primary_key(conn: sqlite3.Connection, table: str, key: str) -> bool:
+    """Rebuild a table with key as its PRIMARY KEY; returns False if it already had one
+
+    Column order and declared types are kept. Duplicate keys would make the
+    rebuild fail, so such tables only get a plain index on the key.
+    """
+    columns = conn.execute(f"PRAGMA table_info({_quote(table)})").fetchall()
+    if not columns or any(col[1] == key and col[5] for col in columns):
+        return False
+
+    duplicates = conn.execute(
+        f"SELECT COUNT(*) - COUNT(DISTINCT {_quote(key)}) FROM {_quote(table)}"
+    ).fetchone()[0]
+    if duplicates:
+        print(f"Warning: {duplicates} duplicate {key} values in {table}; indexing instead of keying")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{key.lower()} "
+                     f"ON {_quote(table)}({_quote(key)})")
+        return False
+
+    definitions = [
+        f"{_quote(name)} {col_type}" + (" PRIMARY KEY" if name == key else "")
+        for _, name, col_type, _, _, _ in columns
+    ]
+    rebuilt = f"{table}_rebuild"
+    with conn:
+        conn.execute(f"DROP TABLE IF EXISTS {_quote(rebuilt)}")
+        conn.execute(f"CREATE TABLE {_quote(rebuilt)} ({', '.join(definitions)})")
+        conn.execute(f"INSERT INTO {_quote(rebuilt)} SELECT * FROM {_quote(table)}")
+        conn.execute(f"DROP TABLE {_quote(table)}")
+        conn.execute(f"ALTER TABLE {_quote(rebuilt)} RENAME TO {_quote(table)}")
+    return True
+
+def schema_missing(conn: sqlite3.Connection) -> bool:
+    """Whether existing data tables lack their keys or indexes (e.g. a database built before apply_schema)"""
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    for table, key in PRIMARY_KEYS.items():
+        if not _table_exists(conn, table):
+            continue
+        columns = conn.execute(f"PRAGMA table_info({_quote(table)})").fetchall()
+        keyed = any(col[1] == key and col[5] for col in columns)
+        if not keyed and f"idx_{table}_{key.lower()}" not in indexes:
+            return True
+    if any(name in indexes for name in RETIRED_INDEXES):
+        return True
+    return any(name not in indexes for name, table, _ in SECONDARY_INDEXES if _table_exists(conn, table))
+
+def apply_schema(conn: sqlite3.Connection) -> Dict[str, List[str]]:
+    """Primary keys, secondary indexes, change-log triggers and fresh planner statistics for the data tables"""
+    summary = {'primary_keys': [], 'indexes': []}
+    for table, key in PRIMARY_KEYS.items():
+        if _table_exists(conn, table) and ensure_primary_key(conn, table, key):
+            summary['primary_keys'].append(f"{table}({key})")
+
+    with conn:
+        for name in RETIRED_INDEXES:
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+        for name, table, columns in SECONDARY_INDEXES:
+            if not _table_exists(conn, table):
+                continue
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {_quote(table)}"
+                         f"({', '.join(_quote(col) for col in columns)})")
+            summary['indexes'].append(name)
+    ensure_change_log(conn)
+    conn.execute("ANALYZE")
+    conn.commit()
+    return summary
+
+def explain(conn: sqlite3.Connection, queries: Dict[str, Tuple[str, Tuple]] = HOT_QUERIES) -> Dict[str, List[str]]:
+    """Query plan (EXPLAIN QUERY PLAN detail lines) of each hot query"""
+    plans = {}
+    for name, (sql, params) in queries.items():
+        try:
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        except sqlite3.OperationalError as e:
+            plans[name] = [f"unavailable: {e}"]
+            continue
+        plans[name] = [row[-1] for row in rows]
+    return plans
@@ -0,0 +1,146 @@
+# utils/scoring.py
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+import json
+import numpy as np
+import pandas as pd
+
+PRICE_BANDS = {'low': 0, 'medium': 1, 'high': 2}
+
+@dataclass(frozen=True)
+class ScoringWeights:
+    category: float
+    price: float
+    brand: float
+    rating: float
+    sentiment: float
+    purchase: float
+    # RecommendationAgent treats a price of exactly 5000 as 'high',
+    # FastRecommendationEngine as 'medium'
+    high_price_inclusive: bool
+    # Scales the customer's co-occurrence affinity to the product's subcategory
+    co_purchase: float = 0.0
+
+# Weights of RecommendationAgent._score_product
+AGENT_WEIGHTS = ScoringWeights(
+    category=0.3, price=0.2, brand=0.2, rating=0.1, sentiment=0.1, purchase=0.1,
+    high_price_inclusive=True, co_purchase=0.1
+)
+
+# Weights of FastRecommendationEngine._score_product
+FAST_WEIGHTS = ScoringWeights(
+    category=0.4, price=0.3, brand=0.0, rating=0.2, sentiment=0.1, purchase=0.0,
+    high_price_inclusive=False, co_purchase=0.1
+)
+
+def price_band_codes(prices: np.ndarray, high_price_inclusive: bool = True) -> np.ndarray:
+    """Map prices to PRICE_BANDS codes (below 1000 low, 5000 and above high)"""
+    high = prices >= 5000 if high_price_inclusive else prices > 5000
+    return np.where(prices < 1000, PRICE_BANDS['low'],
+                    np.where(high, PRICE_BANDS['high'], PRICE_BANDS['medium'])).astype(np.int8)
+
+class VectorizedScorer:
+    """Score every product of a table at once from pre-encoded integer columns
+
+    Terms are accumulated in the same order as the row-wise scoring functions
+    so the resulting floats are identical, not just close.
+    """
+
+    ARRAYS = ('category_codes', 'brand_codes', 'subcategory_codes', 'price_bands', 'ratings', 'sentiments')
+
+    def __init__(self, products: pd.DataFrame, weights: ScoringWeights):
+        self.weights = weights
+        self.category_codes, categories = pd.factorize(products['Category'])
+        self.brand_codes, brands = pd.factorize(products['Brand'])
+        self.subcategory_codes, subcategories = pd.factorize(products['Subcategory'])
+        self.category_index = {cat: code for code, cat in enumerate(categories)}
+        self.brand_index = {brand: code for code, brand in enumerate(brands)}
+        self.subcategory_index = {sub: code for code, sub in enumerate(subcategories)}
+        self.price_bands = price_band_codes(
+            products['Price'].to_numpy(dtype=np.float64), weights.high_price_inclusive
+        )
+        self.ratings = products['Product_Rating'].to_numpy(dtype=np.float64)
+        self.sentiments = products['Customer_Review_Sentiment_Score'].to_numpy(dtype=np.float64)
+
+    def save(self, directory):
+        """Write the encoded columns as .npy files other processes can memory-map"""
+        directory = Path(directory)
+        for name in self.ARRAYS:
+            np.save(directory / f'{name}.npy', getattr(self, name))
+        with open(directory / 'scorer.json', 'w') as f:
+            json.dump({
+                'categories': list(self.category_index),
+                'brands': list(self.brand_index),
+                'subcategories': list(self.subcategory_index)
+            }, f)
+
+    @classmethod
+    def load(cls, directory, weights: ScoringWeights, mmap_mode: Optional[str] = 'r') -> 'VectorizedScorer':
+        """Rebuild a scorer from save() output without touching the database"""
+        directory = Path(directory)
+        scorer = cls.__new__(cls)
+        scorer.weights = weights
+        for name in cls.ARRAYS:
+            setattr(scorer, name, np.load(directory / f'{name}.npy', mmap_mode=mmap_mode))
+        with open(directory / 'scorer.json') as f:
+            meta = json.load(f)
+        scorer.category_index = {cat: code for code, cat in enumerate(meta['categories'])}
+        scorer.brand_index = {brand: code for code, brand in enumerate(meta['brands'])}
+        scorer.subcategory_index = {sub: code for code, sub in enumerate(meta['subcategories'])}
+        return scorer
+
+    def _encode(self, values: Iterable, index: Dict) -> np.ndarray:
+        return np.array([index[v] for v in values if isinstance(v, str) and v in index],
+                        dtype=np.int64)
+
+    def score(self, preferences: Dict, purchase_history: Iterable = (),
+              rows: Optional[np.ndarray] = None, affinity: Optional[Dict[str, float]] = None) -> np.ndarray:
+        """Score all products (or the given row positions) against preferences
+
+        affinity maps subcategories to the customer's co-occurrence affinity
+        (see CoOccurrenceModel.affinity); without it there is no co-purchase term.
+        """
+        if rows is None:
+            rows = slice(None)
+        w = self.weights
+        category_codes = self.category_codes[rows]
+        ratings = self.ratings[rows]
+
+        score = np.zeros(len(ratings), dtype=np.float64)
+        preferred = self._encode(preferences['preferred_categories'], self.category_index)
+        score += np.where(np.isin(category_codes, preferred), w.category, 0.0)
+
+        band = PRICE_BANDS.get(preferences['price_range'], -1)
+        score += np.where(self.price_bands[rows] == band, w.price, 0.0)
+
+        if w.brand:
+            brands = self._encode(preferences.get('brand_preferences', []), self.brand_index)
+            score += np.where(np.isin(self.brand_codes[rows], brands), w.brand, 0.0)
+
+        score += ratings * w.rating
+        score += self.sentiments[rows] * w.sentiment
+
+        if w.purchase:
+            purchased = self._encode(purchase_history, self.category_index)
+            score += np.where(np.isin(category_codes, purchased), w.purchase, 0.0)
+
+        if w.co_purchase and affinity:
+            score += self.co_purchase_term(affinity, rows)
+
+        return score
+
+    def co_purchase_term(self, affinity: Dict[str, float], rows=slice(None)) -> np.ndarray:
+        """Weighted co-purchase affinity of each product, the last term score() adds"""
+        # One slot past the end catches missing subcategories (code -1)
+        by_code = np.zeros(len(self.subcategory_index) + 1, dtype=np.float64)
+        for sub, value in affinity.items():
+            code = self.subcategory_index.get(sub)
+            if code is not None:
+                by_code[code] = value
+        return by_code[self.subcategory_codes[rows]] * self.weights.co_purchase
+
+    def top_affinity_subcategories(self, affinity: Dict[str, float], limit: int) -> List[str]:
+        """The product subcategories a customer has most affinity to"""
+        known = [sub for sub in affinity if sub in self.subcategory_index]
+        return sorted(known, key=lambda sub: -affinity[sub])[:limit]
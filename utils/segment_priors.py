@@ -0,0 +1,121 @@
+# utils/segment_priors.py
+import json
+import os
+import sqlite3
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Optional
+import pandas as pd
+from utils.history import parse_list
+
+SEGMENT_PATTERNS_PATH = 'cache/segment_patterns.json'
+
+def price_range_for(avg_order_value: float) -> str:
+    """Price band of an average order value (same cut-offs as the batch engine)"""
+    if avg_order_value < 2000:
+        return 'low'
+    if avg_order_value > 5000:
+        return 'high'
+    return 'medium'
+
+def context_key(season: str, location: str) -> str:
+    return f"{season}|{location}"
+
+def _summarize(group: pd.DataFrame, top_categories: int) -> Dict:
+    counts = Counter(cat for history in group['Browsing_History'] for cat in parse_list(history))
+    return {
+        'preferred_categories': [cat for cat, _ in counts.most_common(top_categories)],
+        'price_range': price_range_for(group['Avg_Order_Value'].median()),
+        'customers': len(group)
+    }
+
+def build_segment_patterns(conn: sqlite3.Connection, top_categories: int = 3,
+                           min_context_customers: int = 50) -> Dict:
+    """Per-segment preference priors (plus segment x season x location refinements)
+
+    Segment entries keep the original preferred_categories / price_range keys;
+    contexts with at least min_context_customers customers are nested under
+    'contexts' keyed by "Season|Location".
+    """
+    customers = pd.read_sql(
+        "SELECT Customer_Segment, Season, Location, Browsing_History, Avg_Order_Value FROM customers",
+        conn
+    )
+    patterns = {}
+    for segment, group in customers.groupby('Customer_Segment'):
+        entry = _summarize(group, top_categories)
+        contexts = {}
+        for (season, location), context in group.groupby(['Season', 'Location']):
+            if len(context) >= min_context_customers:
+                contexts[context_key(season, location)] = _summarize(context, top_categories)
+        if contexts:
+            entry['contexts'] = contexts
+        patterns[segment] = entry
+    return patterns
+
+def write_segment_patterns(patterns: Dict, path=SEGMENT_PATTERNS_PATH):
+    """Atomically replace the segment patterns file"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(patterns, f, indent=2)
+    os.replace(tmp_path, path)
+
+class SegmentPriors:
+    """Lookup of precomputed segment preference priors"""
+
+    def __init__(self, path=SEGMENT_PATTERNS_PATH):
+        self.path = Path(path)
+        self.patterns = {}
+        if self.path.exists():
+            with open(self.path) as f:
+                self.patterns = json.load(f)
+
+    def lookup(self, segment: str, season: Optional[str] = None,
+               location: Optional[str] = None) -> Optional[Dict]:
+        """Most specific prior for a segment, or None if the segment is unknown"""
+        entry = self.patterns.get(segment)
+        if entry is None:
+            return None
+        context = entry.get('contexts', {}).get(context_key(season, location))
+        return context or entry
+
+class PreferenceResolver:
+    """Tiered preference resolution: segment prior first, LLM only when needed
+
+    Customers with thin history (at most thin_history browsed categories) or
+    whose browsing mostly agrees with their segment's prior are served from
+    the prior. resolve() returns None when the history diverges from the
+    segment by more than max_divergence, signalling an LLM analysis.
+    """
+
+    def __init__(self, priors: SegmentPriors, thin_history: int = 1, max_divergence: float = 0.5):
+        self.priors = priors
+        self.thin_history = thin_history
+        self.max_divergence = max_divergence
+        self.stats = defaultdict(int)
+
+    def resolve(self, profile) -> Optional[Dict]:
+        prior = self.priors.lookup(profile.customer_segment, profile.season, profile.location)
+        if prior is None:
+            self.stats['no_prior'] += 1
+            return None
+
+        browsed = list(dict.fromkeys(profile.browsing_history))
+        if len(browsed) > self.thin_history:
+            outside = [cat for cat in browsed if cat not in prior['preferred_categories']]
+            if len(outside) / len(browsed) > self.max_divergence:
+                self.stats['diverged'] += 1
+                return None
+
+        self.stats['prior'] += 1
+        # The customer's own categories lead; the segment fills in the rest
+        categories = list(dict.fromkeys(browsed + prior['preferred_categories']))
+        return {
+            'preferred_categories': categories,
+            'price_range': price_range_for(profile.avg_order_value),
+            'brand_preferences': [],
+            'style_preferences': [],
+            'seasonal_preferences': [profile.season] if profile.season else []
+        }
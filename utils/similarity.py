@@ -0,0 +1,74 @@
+# utils/similarity.py
+import heapq
+from typing import Iterable, List, Optional
+import numpy as np
+from utils.history import InternedLists
+
+class SimilarityGraph:
+    """Each product's top-K similar products as CSR adjacency arrays
+
+    Similar_Product_List names subcategories, not products. Each listed
+    subcategory is resolved to its best products (Product_Rating, then
+    review sentiment), and a product's neighbours are the best K of those
+    across all its listed subcategories, excluding itself. Neighbours of
+    row i are neighbours[offsets[i]:offsets[i + 1]], best first.
+    """
+
+    def __init__(self, offsets: np.ndarray, neighbours: np.ndarray):
+        self.offsets = offsets
+        self.neighbours = neighbours
+
+    @classmethod
+    def build(cls, subcategory_codes: np.ndarray, subcategory_labels: np.ndarray,
+              similar_items: InternedLists, ratings: np.ndarray, sentiments: np.ndarray,
+              k: int = 10) -> 'SimilarityGraph':
+        # Global rank: rating, then sentiment, best first (ties by row)
+        order = np.lexsort((-sentiments, -ratings))
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+
+        # Best k + 1 products per subcategory (one spare in case it is the product itself)
+        ordered_codes = subcategory_codes[order]
+        best = {}
+        for code, label in enumerate(subcategory_labels):
+            rows = order[ordered_codes == code][:k + 1]
+            best[label] = list(zip(rank[rows].tolist(), rows.tolist()))
+        by_item_code = [best.get(label, []) for label in similar_items.vocabulary.labels]
+
+        offsets = [0]
+        neighbours = []
+        for row in range(len(similar_items)):
+            codes = dict.fromkeys(similar_items.codes_at(row).tolist())
+            # Subcategories are disjoint, so merging by global rank never repeats a product
+            merged = heapq.merge(*(by_item_code[code] for code in codes))
+            picked = 0
+            for _, other in merged:
+                if other != row:
+                    neighbours.append(other)
+                    picked += 1
+                    if picked == k:
+                        break
+            offsets.append(len(neighbours))
+        return cls(np.asarray(offsets, dtype=np.int64), np.asarray(neighbours, dtype=np.int32))
+
+    def neighbours_of(self, row: int, k: Optional[int] = None) -> np.ndarray:
+        """Similar product rows of one product, best first"""
+        start, end = self.offsets[row], self.offsets[row + 1]
+        if k is not None:
+            end = min(end, start + k)
+        return self.neighbours[start:end]
+
+    def expand(self, rows: Iterable[int], limit: int) -> np.ndarray:
+        """More-like-this: neighbours of several products, interleaved by rank, without the inputs"""
+        rows = list(dict.fromkeys(rows))
+        seen = set(rows)
+        lists = [self.neighbours_of(row).tolist() for row in rows]
+        picked: List[int] = []
+        for depth in range(max((len(items) for items in lists), default=0)):
+            for items in lists:
+                if depth < len(items) and items[depth] not in seen:
+                    seen.add(items[depth])
+                    picked.append(items[depth])
+                    if len(picked) == limit:
+                        return np.asarray(picked, dtype=np.int64)
+        return np.asarray(picked, dtype=np.int64)
@@ -0,0 +1,119 @@
+# utils/sqlite_cache.py
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional
+
+class SQLiteCache:
+    """Two-tier (memory + SQLite) key-value cache with optional TTL and LRU eviction
+
+    Each entry carries a tag next to its value (e.g. the model that produced
+    it, or a hash of the inputs it was derived from); lookups that pass a
+    tag only hit entries stored with the same tag. Both tiers evict least
+    recently used entries. Subclasses name the table and its columns and
+    may override encode / decode to store non-string values.
+    """
+
+    TABLE = 'cache'
+    KEY_COLUMN = 'key'
+    TAG_COLUMN = 'tag'
+    VALUE_COLUMN = 'value'
+
+    def __init__(self, db_path, ttl_seconds: Optional[float] = None,
+                 max_memory_entries: int = 1024, max_disk_entries: int = 100000):
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.stats = {'hits': 0, 'misses': 0}
+        self._memory = OrderedDict()  # key -> (tag, created_at, value)
+        self._lock = threading.Lock()
+
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        with self._conn:
+            self._conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS {self.TABLE} (
+                    {self.KEY_COLUMN} TEXT PRIMARY KEY,
+                    {self.TAG_COLUMN} TEXT,
+                    {self.VALUE_COLUMN} TEXT,
+                    created_at REAL,
+                    last_access REAL
+                )
+            ''')
+            self._conn.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{self.TABLE}_access ON {self.TABLE}(last_access)"
+            )
+
+    def encode(self, value: Any) -> str:
+        return value
+
+    def decode(self, stored: str) -> Any:
+        return stored
+
+    def _is_fresh(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds is None or now - created_at < self.ttl_seconds
+
+    def _remember(self, key: str, tag: Optional[str], created_at: float, value: Any):
+        self._memory[key] = (tag, created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def lookup(self, key: str, tag: Optional[str] = None) -> Optional[Any]:
+        """Cached value, or None if missing, expired or (when tag is given) stored under another tag"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and (tag is None or entry[0] == tag) and self._is_fresh(entry[1], now):
+                self._memory.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry[2]
+
+            row = self._conn.execute(
+                f"SELECT {self.TAG_COLUMN}, created_at, {self.VALUE_COLUMN} FROM {self.TABLE} "
+                f"WHERE {self.KEY_COLUMN} = ?", (key,)
+            ).fetchone()
+            if row and (tag is None or row[0] == tag) and self._is_fresh(row[1], now):
+                value = self.decode(row[2])
+                with self._conn:
+                    self._conn.execute(
+                        f"UPDATE {self.TABLE} SET last_access = ? WHERE {self.KEY_COLUMN} = ?",
+                        (now, key)
+                    )
+                self._remember(key, row[0], row[1], value)
+                self.stats['hits'] += 1
+                return value
+
+            self.stats['misses'] += 1
+            return None
+
+    def store(self, key: str, tag: Optional[str], value: Any):
+        """Store a value in both tiers, evicting least recently used rows"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, tag, now, value)
+            with self._conn:
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO {self.TABLE} VALUES (?, ?, ?, ?, ?)",
+                    (key, tag, self.encode(value), now, now)
+                )
+                self._conn.execute(f'''
+                    DELETE FROM {self.TABLE} WHERE {self.KEY_COLUMN} IN (
+                        SELECT {self.KEY_COLUMN} FROM {self.TABLE}
+                        ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                    )
+                ''', (self.max_disk_entries,))
+
+    def invalidate(self, key: str):
+        """Drop an entry from both tiers"""
+        with self._lock:
+            self._memory.pop(key, None)
+            with self._conn:
+                self._conn.execute(f"DELETE FROM {self.TABLE} WHERE {self.KEY_COLUMN} = ?", (key,))
+
+    def close(self):
+        """Close the on-disk store"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,26 @@
+# warm_description_cache.py
+import argparse
+import time
+from agents.product_agent import ProductAgent
+from utils.data_loader import DataHandler
+from utils.llm_client import get_llm_client
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute product descriptions into the LLM response cache")
+    parser.add_argument('--db', default='ecommerce.db')
+    parser.add_argument('--cache-dir', default='cache', help="Directory of the product shards")
+    parser.add_argument('--limit', type=int, default=None, help="Only the first N products")
+    parser.add_argument('--batch-size', type=int, default=64)
+    args = parser.parse_args()
+
+    data_handler = DataHandler(args.db, cache_dir=args.cache_dir)
+    try:
+        product_ids = data_handler.catalog.product_ids[:args.limit]
+        start = time.time()
+        generated = ProductAgent(data_handler).warm_descriptions(product_ids, batch_size=args.batch_size)
+        client = get_llm_client()
+        print(f"\nWarmed {generated}/{len(product_ids)} descriptions in {time.time() - start:.1f}s")
+        print(f"Served from cache: {client.stats['cached']}, failures: {client.stats['failures']}")
+    finally:
+        get_llm_client().close()
+        data_handler.close()